@@ -6,7 +6,7 @@ from .models import Ingredient, Tag
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
     search_fields = ('name', )
-    list_filter = ('name', )
+    list_filter = ('measurement_unit', )
     empty_value_display = '-пусто-'
 
 
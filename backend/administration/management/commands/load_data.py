@@ -1,39 +1,114 @@
+import csv
 import json
 import os
+import re
+import time
+from itertools import islice
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.db.utils import IntegrityError
+from django.db import transaction
 
 from administration.models import Ingredient
+from api.ingredient_index import ingredient_index
 
 DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+READ_SIZE = 64 * 1024
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def iter_json(file):
+    """Потоковое чтение JSON-массива объектов без загрузки всего файла."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Файл не является JSON-массивом')
+    position = 1
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise CommandError('Файл не является JSON-массивом')
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield item['name'], item['measurement_unit']
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+READERS = {
+    'json': iter_json,
+    'csv': iter_csv,
+}
 
 
 class Command(BaseCommand):
-    help = 'loading ingredients from data in json'
+    help = 'loading ingredients from data in json or csv'
 
     def add_arguments(self, parser):
         parser.add_argument('filename', default='ingredients.json', nargs='?',
                             type=str)
+        parser.add_argument('--format', choices=READERS,
+                            help='file format, by default from extension')
+        parser.add_argument('--batch-size', default=1000, type=int)
 
     def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше 0')
+        filename = options['filename']
+        file_format = (
+            options['format'] or os.path.splitext(filename)[1].lstrip('.')
+        )
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат файла: {file_format or filename}'
+            )
         try:
-            with open(os.path.join(DATA_ROOT, options['filename']), 'r',
+            with open(os.path.join(DATA_ROOT, filename), 'r',
                       encoding='utf-8') as f:
-                data = json.load(f)
-                for ingredient in data:
-                    try:
-                        Ingredient.objects.create(name=ingredient["name"],
-                                                  measurement_unit=ingredient[
-                                                      "measurement_unit"])
-                    except IntegrityError:
-                        print(
-                            f'Ингредиент {Ingredient["Название ингредиента"]}'
-                            f'{Ingredient["Единица иземерения"]} '
-                            f'уже есть в базе'
-                        )
-
+                started = time.monotonic()
+                total, inserted = self.load(
+                    READERS[file_format](f), options['batch_size']
+                )
         except FileNotFoundError:
             raise CommandError('Файл отсутствует в директории data')
-        return None
+        elapsed = time.monotonic() - started
+        ingredient_index.invalidate()
+        if not options['verbosity']:
+            return
+        # Ингредиент целиком задаётся ключом (название, единица измерения),
+        # поэтому существующие строки обновлять нечем — они пропускаются.
+        self.stdout.write(
+            f'Добавлено: {inserted}, обновлено: 0, '
+            f'пропущено: {total - inserted}, строк в файле: {total}, '
+            f'{total / elapsed if elapsed else total:.0f} строк/с'
+        )
+
+    @staticmethod
+    def load(rows, batch_size):
+        total = 0
+        with transaction.atomic():
+            before = Ingredient.objects.count()
+            while True:
+                batch = [
+                    Ingredient(
+                        name=name.strip(),
+                        measurement_unit=measurement_unit.strip(),
+                    )
+                    for name, measurement_unit in islice(rows, batch_size)
+                ]
+                if not batch:
+                    break
+                total += len(batch)
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+            inserted = Ingredient.objects.count() - before
+        return total, inserted
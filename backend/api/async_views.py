@@ -0,0 +1,46 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def _call(view, request, *args, **kwargs):
+    """Запрос в потоке пула: соединения с базой проверяются до и после,
+    как это делает обработчик Django для своего потока."""
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read(view):
+    """Асинхронная версия представления DRF.
+
+    Синхронные представления под ASGI в Django 3.2 выполняются в одном
+    общем потоке, поэтому чтение уходит в пул потоков и идёт параллельно.
+    Запись остаётся в общем потоке, как у обычных представлений.
+    """
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        return await sync_to_async(
+            _call, thread_sensitive=request.method not in READ_METHODS
+        )(view, request, *args, **kwargs)
+    return async_view
+
+
+def async_read_urls(urlpatterns, names):
+    """Подменяет представления маршрутов с именами из names на async_read."""
+    return [
+        URLPattern(
+            pattern.pattern, async_read(pattern.callback),
+            pattern.default_args, pattern.name,
+        ) if getattr(pattern, 'name', None) in names else pattern
+        for pattern in urlpatterns
+    ]
@@ -0,0 +1,97 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from users.models import TOKEN_USER_FIELDS, User
+
+TOKEN_KEY = 'auth_token:{}'
+# Сколько секунд процесс доверяет своей копии: после выхода или смены
+# пароля в другом процессе старый токен работает не дольше этого.
+LOCAL_TIMEOUT = 10
+# В порядке полей модели, как ждёт Model.from_db() с неполным набором.
+USER_FIELDS = [
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in TOKEN_USER_FIELDS
+]
+
+
+def _cache_key(key):
+    """В общем кэше токен хранится только в виде хэша."""
+    return TOKEN_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+class TokenCache:
+    """Поля USER_FIELDS пользователей по токенам: ограниченный LRU
+    в памяти процесса поверх общего кэша Django. Хэш пароля и остальные
+    поля в кэш не попадают."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+
+    def get(self, key):
+        """Кортеж значений USER_FIELDS или None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(key)
+            if entry is not None and entry[0] > now:
+                self._users.move_to_end(key)
+                return entry[1]
+        values = cache.get(_cache_key(key))
+        if values is not None:
+            self._remember(key, values, now)
+        return values
+
+    def set(self, key, user):
+        values = tuple(getattr(user, field) for field in USER_FIELDS)
+        cache.set(_cache_key(key), values, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        self._remember(key, values, time.monotonic())
+
+    def _remember(self, key, values, now):
+        with self._lock:
+            self._users[key] = (now + LOCAL_TIMEOUT, values)
+            self._users.move_to_end(key)
+            while len(self._users) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._users.popitem(last=False)
+
+    def invalidate(self, *keys):
+        """Сброс сразу и после коммита, чтобы не закэшировать старые
+        данные."""
+        with self._lock:
+            for key in keys:
+                self._users.pop(key, None)
+        cache_keys = [_cache_key(key) for key in keys]
+        cache.delete_many(cache_keys)
+        transaction.on_commit(lambda: cache.delete_many(cache_keys))
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе, если токен уже в кэше.
+
+    Пользователь из кэша — новый экземпляр с полями USER_FIELDS,
+    остальные поля, например пароль для смены пароля, загружаются из базы
+    при обращении.
+    """
+
+    def authenticate_credentials(self, key):
+        values = token_cache.get(key)
+        if values is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user)
+            return user, token
+        user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, values)
+        if not user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return user, Token(key=key, user=user)
@@ -0,0 +1,470 @@
+import gc
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import time
+import tracemalloc
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from administration.models import Ingredient, Tag
+from api.counters import reconcile_counters
+from api.feed import FEED_ORDERING, rebuild_feeds
+from api.pagination import MergedKeysetPagination
+from api.search import update_search_documents
+from api.shopping_list import rebuild_shopping_lists
+from api.similarity import build_similar_recipes
+from cook.models import IngredientRecipe, Recipe
+from print.models import Favorite, FeedItem, ShoppingCart
+from users.models import Follow, User
+
+BUDGETS_FILE = os.path.join(
+    settings.BASE_DIR, 'data', 'benchmark_budgets.json'
+)
+BENCH_PASSWORD = 'bench-password'
+BATCH_SIZE = 1000
+# Задержка сравнивается с задержкой этого эндпоинта в том же прогоне:
+# бюджет не зависит от скорости машины.
+BASELINE_ENDPOINT = 'tags-list'
+# Быстрым ответам разрешено столько задержек базового эндпоинта,
+# иначе бюджет срабатывает от случайного шума.
+MIN_LATENCY_RATIO = 5
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+)
+
+
+def seed_dataset(users=2000, recipes=5000, favorites=20000, carts=5000,
+                 follows=10000, seed=0):
+    """Синтетические данные для замеров: пользователи, рецепты, связи."""
+    rnd = random.Random(seed)
+    if not Ingredient.objects.exists():
+        call_command('load_data', verbosity=0)
+    tags = [
+        Tag.objects.get_or_create(
+            slug=slug, defaults={'name': name, 'color': color}
+        )[0] for name, slug, color in TAGS
+    ]
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    password = make_password(BENCH_PASSWORD)
+    User.objects.bulk_create(
+        (User(username=f'bench{i}', email=f'bench{i}@example.com',
+              first_name='Bench', last_name=str(i), password=password)
+         for i in range(users)),
+        batch_size=BATCH_SIZE,
+    )
+    user_ids = list(
+        User.objects.filter(username__startswith='bench')
+        .order_by('id').values_list('id', flat=True)
+    )
+    Recipe.objects.bulk_create(
+        (Recipe(author_id=rnd.choice(user_ids), name=f'Рецепт {i}',
+                title=f'Рецепт {i}', text='Описание рецепта ' * 10,
+                cooking_time=rnd.randint(1, 180),
+                image='recipe_images/temp.png')
+         for i in range(recipes)),
+        batch_size=BATCH_SIZE,
+    )
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    Recipe.tags.through.objects.bulk_create(
+        (Recipe.tags.through(recipe_id=recipe_id, tag_id=tag.id)
+         for recipe_id in recipe_ids
+         for tag in rnd.sample(tags, rnd.randint(1, len(tags)))),
+        batch_size=BATCH_SIZE,
+    )
+    IngredientRecipe.objects.bulk_create(
+        (IngredientRecipe(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                          amount=rnd.randint(1, 500))
+         for recipe_id in recipe_ids
+         for ingredient_id in rnd.sample(ingredient_ids, rnd.randint(3, 12))),
+        batch_size=BATCH_SIZE,
+    )
+    for model, count in ((Favorite, favorites), (ShoppingCart, carts)):
+        model.objects.bulk_create(
+            (model(user_id=rnd.choice(user_ids),
+                   recipe_id=rnd.choice(recipe_ids))
+             for _ in range(count)),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+    Follow.objects.bulk_create(
+        (Follow(user_id=user_id, author_id=author_id)
+         for user_id, author_id in (
+             rnd.sample(user_ids, 2) for _ in range(follows)
+        )),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    bench_user = User.objects.get(id=user_ids[0])
+    # У основного пользователя заведомо непустые корзина и подписки.
+    ShoppingCart.objects.bulk_create(
+        (ShoppingCart(user=bench_user, recipe_id=recipe_id)
+         for recipe_id in rnd.sample(recipe_ids, min(50, len(recipe_ids)))),
+        ignore_conflicts=True,
+    )
+    Follow.objects.bulk_create(
+        (Follow(user=bench_user, author_id=author_id)
+         for author_id in rnd.sample(user_ids[1:], min(30, users - 1))),
+        ignore_conflicts=True,
+    )
+    update_search_documents()
+    reconcile_counters()
+    rebuild_shopping_lists()
+    rebuild_feeds()
+    build_similar_recipes()
+    return bench_user
+
+
+def _recipe_payload(ctx):
+    return {
+        'name': 'Новый рецепт',
+        'text': 'Описание',
+        'cooking_time': 10,
+        'image': IMAGE,
+        'tags': [ctx['tag'].id],
+        'ingredients': [
+            {'id': ingredient_id, 'amount': 10}
+            for ingredient_id in ctx['ingredient_ids']
+        ],
+    }
+
+
+def _created_recipe(ctx):
+    return f'/api/recipes/{ctx["created"]}/'
+
+
+def _registration_payload(ctx):
+    """Новые email и username на каждый запрос регистрации."""
+    number = next(ctx['registered'])
+    return {
+        'email': f'registered{number}@example.com',
+        'username': f'registered{number}',
+        'first_name': 'Registered',
+        'last_name': str(number),
+        'password': BENCH_PASSWORD,
+    }
+
+
+# (название, метод, адрес, тело запроса). Адрес и тело могут быть
+# функциями от контекста. Записывающие запросы идут парами
+# «создать — удалить», чтобы каждая итерация начиналась с тех же данных.
+ENDPOINTS = (
+    ('ingredients-list', 'get', '/api/ingredients/', None),
+    ('ingredients-search', 'get', '/api/ingredients/?name=сах', None),
+    ('ingredients-detail', 'get',
+     lambda ctx: f'/api/ingredients/{ctx["ingredient_ids"][0]}/', None),
+    ('tags-list', 'get', '/api/tags/', None),
+    ('tags-detail', 'get', lambda ctx: f'/api/tags/{ctx["tag"].id}/', None),
+    ('recipes-list', 'get', '/api/recipes/', None),
+    ('recipes-list-limit-50', 'get', '/api/recipes/?limit=50', None),
+    ('recipes-list-deep-page', 'get', '/api/recipes/?page=200', None),
+    ('recipes-filter-tags', 'get',
+     '/api/recipes/?tags=breakfast&tags=dinner', None),
+    ('recipes-filter-tags-all', 'get',
+     '/api/recipes/?tags=breakfast&tags=dinner&tags_mode=all', None),
+    ('recipes-filter-author', 'get',
+     lambda ctx: f'/api/recipes/?author={ctx["author"].id}', None),
+    ('recipes-filter-favorited', 'get', '/api/recipes/?is_favorited=1', None),
+    ('recipes-filter-cart', 'get',
+     '/api/recipes/?is_in_shopping_cart=1', None),
+    ('recipes-filter-combined', 'get',
+     '/api/recipes/?tags=lunch&is_favorited=1&is_in_shopping_cart=1', None),
+    ('recipes-search', 'get', '/api/recipes/?search=сахар', None),
+    ('recipes-search-words', 'get',
+     '/api/recipes/?search=рецепт сах&tags=lunch', None),
+    ('recipes-detail', 'get',
+     lambda ctx: f'/api/recipes/{ctx["recipe"].id}/', None),
+    ('recipes-similar', 'get',
+     lambda ctx: f'/api/recipes/{ctx["recipe"].id}/similar/', None),
+    ('recipes-feed', 'get', '/api/recipes/feed/', None),
+    ('recipes-feed-next-page', 'get',
+     lambda ctx: ctx['feed_next'], None),
+    ('recipes-create', 'post', '/api/recipes/', _recipe_payload),
+    ('recipes-update', 'patch', _created_recipe, _recipe_payload),
+    ('recipes-delete', 'delete', _created_recipe, None),
+    ('download-shopping-cart', 'get',
+     '/api/recipes/download_shopping_cart/', None),
+    ('download-shopping-cart-csv', 'get',
+     '/api/recipes/download_shopping_cart/?file_format=csv', None),
+    ('download-shopping-cart-pdf', 'get',
+     '/api/recipes/download_shopping_cart/?file_format=pdf', None),
+    ('shopping-cart-add', 'post',
+     lambda ctx: f'/api/recipes/{ctx["recipe"].id}/shopping_cart/', None),
+    ('shopping-cart-remove', 'delete',
+     lambda ctx: f'/api/recipes/{ctx["recipe"].id}/shopping_cart/', None),
+    ('favorite-add', 'post',
+     lambda ctx: f'/api/recipes/{ctx["recipe"].id}/favorite/', None),
+    ('favorite-remove', 'delete',
+     lambda ctx: f'/api/recipes/{ctx["recipe"].id}/favorite/', None),
+    ('shopping-cart-add-batch', 'post', '/api/recipes/shopping_cart/',
+     lambda ctx: {'recipes': ctx['batch_recipe_ids']}),
+    ('shopping-cart-remove-batch', 'delete', '/api/recipes/shopping_cart/',
+     lambda ctx: {'recipes': ctx['batch_recipe_ids']}),
+    ('favorite-add-batch', 'post', '/api/recipes/favorite/',
+     lambda ctx: {'recipes': ctx['batch_recipe_ids']}),
+    ('favorite-remove-batch', 'delete', '/api/recipes/favorite/',
+     lambda ctx: {'recipes': ctx['batch_recipe_ids']}),
+    ('users-list', 'get', '/api/users/', None),
+    ('users-detail', 'get',
+     lambda ctx: f'/api/users/{ctx["author"].id}/', None),
+    ('users-me', 'get', '/api/users/me/', None),
+    ('users-create', 'post', '/api/users/', _registration_payload),
+    # Тот же пароль: следующая итерация начинается с тех же данных.
+    ('users-set-password', 'post', '/api/users/set_password/',
+     {'current_password': BENCH_PASSWORD, 'new_password': BENCH_PASSWORD}),
+    ('subscriptions', 'get', '/api/users/subscriptions/', None),
+    ('subscriptions-recipes-limit', 'get',
+     '/api/users/subscriptions/?recipes_limit=3', None),
+    ('subscribe', 'post',
+     lambda ctx: f'/api/users/{ctx["author"].id}/subscribe/', None),
+    ('unsubscribe', 'delete',
+     lambda ctx: f'/api/users/{ctx["author"].id}/subscribe/', None),
+    ('token-login', 'post', '/api/auth/token/login/',
+     lambda ctx: {'email': ctx['login_user'].email,
+                  'password': BENCH_PASSWORD}),
+    ('token-logout', 'post', '/api/auth/token/logout/', None),
+)
+
+
+def _feed_next_page(bench_user):
+    """Вторая страница ленты: курсор после первой страницы."""
+    pagination = MergedKeysetPagination(FEED_ORDERING)
+    rows = list(
+        FeedItem.objects.filter(user=bench_user).order_by(*FEED_ORDERING)
+        .values('pub_date', 'recipe_id')[:pagination.page_size]
+    )
+    if len(rows) < pagination.page_size:
+        return None
+    return f'/api/recipes/feed/?cursor={pagination.encode_cursor(rows[-1])}'
+
+
+def _context(bench_user):
+    followed = bench_user.follower.values_list('author', flat=True)
+    carted = bench_user.shopping_list.values_list('recipe', flat=True)
+    favorited = bench_user.favorites.values_list('recipe', flat=True)
+    return {
+        'user': bench_user,
+        'author': User.objects.exclude(id__in=followed).exclude(
+            id=bench_user.id).filter(recipes__isnull=False).first(),
+        'recipe': Recipe.objects.exclude(id__in=carted).exclude(
+            id__in=favorited).first(),
+        'batch_recipe_ids': list(
+            Recipe.objects.exclude(id__in=carted).exclude(
+                id__in=favorited).values_list('id', flat=True)[1:21]
+        ),
+        'tag': Tag.objects.first(),
+        'ingredient_ids': list(
+            Ingredient.objects.values_list('id', flat=True)[:10]
+        ),
+        'login_user': User.objects.exclude(id=bench_user.id).first(),
+        'password_user': User.objects.exclude(
+            id=bench_user.id
+        ).order_by('-id').first(),
+        'registered': itertools.count(),
+        'feed_next': _feed_next_page(bench_user),
+        'created': None,
+    }
+
+
+def _clients(ctx):
+    anonymous = APIClient(raise_request_exception=False)
+    logged_in = APIClient(raise_request_exception=False)
+    token, _ = Token.objects.get_or_create(user=ctx['user'])
+    logged_in.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return {'anonymous': anonymous, 'user': logged_in}
+
+
+def _request(client, method, url, data):
+    response = getattr(client, method)(url, data=data, format='json')
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+def _resolve(value, ctx):
+    return value(ctx) if callable(value) else value
+
+
+# Эндпоинты, которые выполняются отдельным пользователем: выход удаляет
+# токен, смена пароля сбрасывает кэш токенов пользователя.
+SEPARATE_USERS = {
+    'token-logout': 'login_user',
+    'users-set-password': 'password_user',
+}
+
+
+def _separate_client(ctx, role, user):
+    """Клиент отдельного пользователя; токен берётся из логина."""
+    client = APIClient(raise_request_exception=False)
+    if role == 'user':
+        token, _ = Token.objects.get_or_create(user=ctx[user])
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+def _measure_once(send):
+    """Подсчёт запросов и пиковой памяти одного запроса."""
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        response = send()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return response, {
+        'status': response.status_code,
+        'queries': len(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def _percentiles(timings):
+    timings = sorted(timings) or [0.0]
+    return {
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(timings[math.ceil(len(timings) * 0.95) - 1], 2),
+    }
+
+
+def bench_session(bench_user):
+    """Контекст и клиенты (аноним и пользователь) для запросов замера."""
+    ctx = _context(bench_user)
+    return ctx, _clients(ctx)
+
+
+def endpoint_requests(session, only=None):
+    """Один проход по эндпоинтам: (роль, название, отправка).
+
+    Отправка выполняет запрос и запоминает созданный рецепт для следующих
+    запросов пары, поэтому её нужно вызвать до перехода к следующему.
+    """
+    ctx, clients = session
+    endpoints = [e for e in ENDPOINTS if not only or e[0] in only]
+    for role, name, method, url, data in (
+        (role, *endpoint) for role in clients for endpoint in endpoints
+    ):
+        client = clients[role]
+        if name in SEPARATE_USERS:
+            client = _separate_client(ctx, role, SEPARATE_USERS[name])
+        url = _resolve(url, ctx)
+        if url is None:
+            continue
+        payload = _resolve(data, ctx)
+
+        def send(client=client, method=method, url=url, payload=payload,
+                 name=name):
+            response = _request(client, method, url, payload)
+            if name == 'recipes-create':
+                ctx['created'] = response.data.get('id')
+            elif name == 'recipes-delete':
+                ctx['created'] = None
+            return response
+
+        yield role, name, send
+
+
+def run_benchmarks(bench_user, iterations=20, only=None):
+    """Замер числа запросов, задержки и пикового потребления памяти."""
+    session = bench_session(bench_user)
+    if only:
+        only = {*only, BASELINE_ENDPOINT}
+    # Ответы 4xx для анонима ожидаемы и не должны засорять вывод.
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    samples = defaultdict(list)
+    results = {}
+    # Как в timeit: сборщик мусора не должен попадать в замер задержки.
+    gc.collect()
+    gc.freeze()
+    for iteration in range(iterations + 2):
+        for role, name, send in endpoint_requests(session, only):
+            if iteration == 0:
+                # Прогрев: ленивые импорты и кэши не должны влиять на замер.
+                send()
+            elif iteration == 1:
+                _, results[role, name] = _measure_once(send)
+            else:
+                gc.disable()
+                start = time.perf_counter()
+                send()
+                samples[role, name].append(
+                    (time.perf_counter() - start) * 1000
+                )
+                gc.enable()
+    gc.unfreeze()
+    for key, value in results.items():
+        value.update(_percentiles(samples[key]))
+    baseline = max(results['anonymous', BASELINE_ENDPOINT]['p95_ms'], 0.01)
+    for value in results.values():
+        value['p95_ratio'] = round(value['p95_ms'] / baseline, 2)
+    return {f'{role} {name}': value for (role, name), value in results.items()}
+
+
+def load_budgets(path=BUDGETS_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_budgets(results, path=BUDGETS_FILE, headroom=2.0):
+    """Бюджет по запросам точный, по памяти и задержке — с запасом.
+
+    Задержка хранится в долях задержки BASELINE_ENDPOINT, не меньше
+    MIN_LATENCY_RATIO. Эндпоинты, которые не замерялись, сохраняют
+    прежний бюджет.
+    """
+    budgets = load_budgets(path)
+    budgets.update({
+        key: {
+            'queries': value['queries'],
+            'p95_ratio': round(
+                max(value['p95_ratio'] * headroom, MIN_LATENCY_RATIO), 1
+            ),
+            'peak_kb': round(value['peak_kb'] * headroom, 1),
+        }
+        for key, value in results.items()
+    })
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(
+            dict(sorted(budgets.items())), f, ensure_ascii=False, indent=2
+        )
+        f.write('\n')
+
+
+def check_budgets(results, budgets, latency=False):
+    """Список нарушений: ошибки сервера и превышения бюджета.
+
+    Задержка даже в долях базового эндпоинта зависит от загрузки машины,
+    поэтому проверяется только с latency.
+    """
+    metrics = ('queries', 'peak_kb', 'p95_ratio') if latency else (
+        'queries', 'peak_kb'
+    )
+    failures = []
+    for key, value in results.items():
+        if value['status'] >= 500:
+            failures.append(f'{key}: статус {value["status"]}')
+        budget = budgets.get(key)
+        if budget is None:
+            continue
+        for metric in metrics:
+            if metric in budget and value[metric] > budget[metric]:
+                failures.append(
+                    f'{key}: {metric} {value[metric]} > {budget[metric]}'
+                )
+    return failures
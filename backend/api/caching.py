@@ -0,0 +1,85 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework.response import Response
+
+from api.replicas import read_from_primary
+
+VERSION_KEY = 'reference_version:{}'
+BODY_KEY = 'reference_body:{}:{}:{}'
+
+
+def get_version(model):
+    """Версия данных модели — время последнего изменения в миллисекундах.
+
+    Начальное значение — время первого обращения, поэтому после
+    перезапуска или очистки кэша старые ETag клиентов не совпадут.
+    """
+    key = VERSION_KEY.format(model._meta.label_lower)
+    version = cache.get(key)
+    if version is not None:
+        return version
+    cache.add(key, int(time.time() * 1000), timeout=None)
+    return cache.get(key)
+
+
+def bump_version(model):
+    key = VERSION_KEY.format(model._meta.label_lower)
+    version = max(int(time.time() * 1000), (cache.get(key) or 0) + 1)
+    cache.set(key, version, timeout=None)
+    return version
+
+
+def _representation(request):
+    """Ответ зависит от адреса с параметрами и формата вывода."""
+    renderer = getattr(request, 'accepted_renderer', None)
+    return hashlib.md5(
+        f'{getattr(renderer, "format", "")}:{request.get_full_path()}'
+        .encode()
+    ).hexdigest()
+
+
+def cached_reference(model):
+    """Кэш ответа справочника для методов list и retrieve вьюсета.
+
+    ETag и Last-Modified строятся из версии модели, If-None-Match и
+    If-Modified-Since обрабатывает condition без обращения к базе.
+    Сериализованные данные хранятся в кэше под той же версией, изменение
+    модели меняет версию и тем самым сбрасывает все ответы сразу.
+    """
+    def etag(request, *args, **kwargs):
+        return f'{get_version(model)}-{_representation(request)}'
+
+    def last_modified(request, *args, **kwargs):
+        return datetime.fromtimestamp(
+            get_version(model) / 1000, tz=timezone.utc
+        )
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = BODY_KEY.format(
+                model._meta.label_lower,
+                get_version(model),
+                _representation(request),
+            )
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+            with read_from_primary():
+                response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(
+                    key, response.data, settings.REFERENCE_CACHE_TIMEOUT
+                )
+            return response
+        return method_decorator(
+            condition(etag_func=etag, last_modified_func=last_modified)
+        )(wrapper)
+    return decorator
@@ -0,0 +1,68 @@
+import logging
+import os
+import sys
+
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+LOCAL_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+SHARED_CACHE_HINT = (
+    'Укажите общий кэш в CACHE_BACKEND и CACHE_LOCATION, например '
+    'memcached из infra/docker-compose.yml.'
+)
+
+
+def worker_count(argv=None):
+    """Число процессов из WEB_CONCURRENCY или --workers/-w командной
+    строки gunicorn и uvicorn; воркеры видят командную строку мастера."""
+    argv = sys.argv if argv is None else argv
+    workers = os.getenv('WEB_CONCURRENCY', '1')
+    for position, argument in enumerate(argv):
+        if argument in ('-w', '--workers') and position + 1 < len(argv):
+            workers = argv[position + 1]
+        elif argument.startswith('--workers='):
+            workers = argument.split('=', 1)[1]
+    try:
+        return int(workers)
+    except ValueError:
+        return 1
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs=None, **kwargs):
+    """Отметки избранного и корзины, закрепление за основной базой после
+    записи, версии справочников и сброс токенов живут в кэше: в памяти
+    процесса их не видят остальные процессы."""
+    if settings.CACHES['default']['BACKEND'] != LOCAL_CACHE:
+        return []
+    messages = []
+    if settings.DATABASE_REPLICAS:
+        messages.append(Error(
+            'Реплики для чтения настроены, а кэш — в памяти процесса: '
+            'после записи пользователь может читать устаревшие данные '
+            'с реплики.',
+            hint=SHARED_CACHE_HINT,
+            id='api.E001',
+        ))
+    workers = worker_count()
+    if workers > 1:
+        messages.append(Warning(
+            f'Процессов: {workers}, а кэш — в памяти процесса: отметки '
+            'избранного и корзины и фильтры по ним устаревают, сброс '
+            'токенов не доходит до остальных процессов.',
+            hint=SHARED_CACHE_HINT,
+            id='api.W001',
+        ))
+    return messages
+
+
+def check_server_startup():
+    """Для точек входа WSGI и ASGI: gunicorn не выполняет системные
+    проверки Django, поэтому ошибки конфигурации кэша проверяются здесь."""
+    for message in check_shared_cache():
+        if message.is_serious():
+            raise ImproperlyConfigured(f'{message.msg} {message.hint}')
+        logger.warning('%s %s', message.msg, message.hint)
@@ -0,0 +1,83 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from api.feed import fan_out_resumed, schedule_backfill
+from cook.models import Recipe
+from print.models import Favorite, ShoppingCart
+from users.models import Follow, User
+
+# (модель со счётчиком, поле счётчика, считаемая модель, внешний ключ)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def _update_counter(model, field, pks, delta):
+    counters = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        # Счётчик с расхождением не уходит в минус до сверки.
+        counters = counters.filter(**{f'{field}__gte': -delta})
+    counters.update(**{field: F(field) + delta})
+
+
+def change_counters(sender, instance, delta):
+    """Атомарно меняет счётчики, которые зависят от строки instance."""
+    for model, field, source, foreign_key in COUNTERS:
+        if source is sender:
+            _update_counter(
+                model, field, [getattr(instance, f'{foreign_key}_id')], delta
+            )
+
+
+def bulk_change_counters(sender, instances, delta):
+    """Счётчики для строк, записанных без сигналов: bulk_create или
+    удаление одним DELETE. Один UPDATE на каждое различное изменение."""
+    for model, field, source, foreign_key in COUNTERS:
+        if source is not sender:
+            continue
+        rows = Counter(
+            getattr(instance, f'{foreign_key}_id') for instance in instances
+        )
+        pks_by_rows = defaultdict(list)
+        for pk, count in rows.items():
+            pks_by_rows[count].append(pk)
+        for count, pks in pks_by_rows.items():
+            _update_counter(model, field, pks, delta * count)
+
+
+def actual_count(source, foreign_key):
+    return Coalesce(Subquery(
+        source.objects.filter(**{foreign_key: OuterRef('pk')}).order_by()
+        .values(foreign_key).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+def reconcile_counters():
+    """Исправляет счётчики, разошедшиеся с таблицами, одним UPDATE на поле.
+
+    Авторы, у которых исправленный счётчик подписчиков опустился до порога
+    раскладки ленты, отмечаются для backfill_outdated_feeds. Возвращает
+    число исправленных строк для каждого счётчика.
+    """
+    fixed, resumed = {}, []
+    for model, field, source, foreign_key in COUNTERS:
+        count = actual_count(source, foreign_key)
+        drifted = model.objects.annotate(actual=count).exclude(
+            **{field: F('actual')}
+        )
+        if (model, field) == (User, 'followers_count'):
+            resumed = [
+                pk for pk, old, new
+                in drifted.values_list('pk', field, 'actual')
+                if fan_out_resumed(old, new)
+            ]
+        fixed[f'{model._meta.label}.{field}'] = model.objects.filter(
+            pk__in=drifted.values('pk')
+        ).update(**{field: count})
+    schedule_backfill(resumed)
+    return fixed
@@ -0,0 +1,108 @@
+import csv
+import logging
+import tempfile
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from reportlab.pdfgen import canvas
+
+TITLE = 'Что купить в магазине:'
+CHUNK_SIZE = 64 * 1024
+PDF_SPOOL_SIZE = 1024 * 1024
+PDF_FONT = 'ShoppingListFont'
+PDF_FONT_SIZE = 11
+PDF_LINE_HEIGHT = 16
+PDF_MARGIN = 50
+
+logger = logging.getLogger(__name__)
+
+
+def _line(ingredient):
+    return (
+        f"{ingredient['ingredient__name']} "
+        f"({ingredient['ingredient__measurement_unit']}) - "
+        f"{ingredient['amount']}"
+    )
+
+
+def txt_chunks(ingredients):
+    yield TITLE
+    for ingredient in ingredients:
+        yield '\n' + _line(ingredient)
+
+
+class _Echo:
+    """Буфер для csv.writer, который сразу отдаёт записанную строку."""
+    def write(self, value):
+        return value
+
+
+def csv_chunks(ingredients):
+    writer = csv.writer(_Echo())
+    # BOM нужен, чтобы Excel открыл кириллицу в UTF-8.
+    yield '\ufeff' + writer.writerow(
+        ('Ингредиент', 'Единица измерения', 'Количество')
+    )
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['amount'],
+        ))
+
+
+def register_pdf_font():
+    """Регистрирует шрифт PDF; False, если файла шрифта нет или он
+    повреждён. Вызывается до ответа: после заголовков 200 ошибку клиенту
+    уже не передать."""
+    if PDF_FONT in pdfmetrics.getRegisteredFontNames():
+        return True
+    try:
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT, settings.SHOPPING_LIST_FONT)
+        )
+    except TTFError:
+        logger.exception(
+            'Шрифт списка покупок не загружен: %s',
+            settings.SHOPPING_LIST_FONT,
+        )
+        return False
+    return True
+
+
+def pdf_chunks(ingredients):
+    """PDF собирается во временном файле и отдаётся кусками.
+
+    Файл держится в памяти до PDF_SPOOL_SIZE и дальше уходит на диск.
+    Список агрегирован по ингредиентам, так что число страниц
+    ограничено размером справочника, а не числом рецептов в корзине.
+    Шрифт должен быть зарегистрирован заранее: register_pdf_font.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_SIZE) as buffer:
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        _, height = A4
+        y = height - PDF_MARGIN
+        pdf.setFont(PDF_FONT, PDF_FONT_SIZE + 3)
+        pdf.drawString(PDF_MARGIN, y, TITLE)
+        pdf.setFont(PDF_FONT, PDF_FONT_SIZE)
+        for ingredient in ingredients:
+            y -= PDF_LINE_HEIGHT
+            if y < PDF_MARGIN:
+                pdf.showPage()
+                pdf.setFont(PDF_FONT, PDF_FONT_SIZE)
+                y = height - PDF_MARGIN
+            pdf.drawString(PDF_MARGIN, y, '• ' + _line(ingredient))
+        pdf.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(CHUNK_SIZE), b'')
+
+
+# Формат: (функция-генератор, content type, расширение файла, проверка
+# готовности до начала ответа или None).
+SHOPPING_LIST_FORMATS = {
+    'txt': (txt_chunks, 'text/plain; charset=utf-8', 'txt', None),
+    'csv': (csv_chunks, 'text/csv; charset=utf-8', 'csv', None),
+    'pdf': (pdf_chunks, 'application/pdf', 'pdf', register_pdf_font),
+}
@@ -0,0 +1,135 @@
+from django.conf import settings
+from django.db.models import F
+
+from cook.models import Recipe
+from print.models import FeedItem
+from users.models import Follow, User
+
+FEED_ORDERING = ('-pub_date', '-recipe_id')
+# Подписчиков на одну пачку INSERT при раскладке рецепта.
+FEED_BATCH_SIZE = 1000
+# Сколько последних рецептов автора попадает в ленту при подписке.
+FEED_BACKFILL_RECIPES = 100
+
+
+def _pushed(queryset, author_field):
+    """Только авторы, чьи рецепты раскладываются по лентам: у авторов с
+    большим числом подписчиков лента дополняется при чтении."""
+    return queryset.filter(**{
+        f'{author_field}__followers_count__lte':
+            settings.FEED_FANOUT_MAX_FOLLOWERS,
+    })
+
+
+def latest_recipes(author_id):
+    return list(
+        _pushed(Recipe.objects.filter(author=author_id), 'author')
+        .order_by('-pub_date', '-id')
+        .values_list('id', 'pub_date')[:FEED_BACKFILL_RECIPES]
+    )
+
+
+def _insert(user_ids, recipes):
+    FeedItem.objects.bulk_create(
+        (FeedItem(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+         for user_id in user_ids for recipe_id, pub_date in recipes),
+        ignore_conflicts=True,
+    )
+
+
+def fan_out(author_id, recipes, user_ids=None):
+    """Записывает рецепты [(id, pub_date)] в ленты подписчиков автора
+    (или только user_ids) пачками по FEED_BATCH_SIZE подписчиков."""
+    followers = _pushed(Follow.objects.filter(author=author_id), 'author')
+    if user_ids is not None:
+        followers = followers.filter(user__in=user_ids)
+    followers = followers.order_by('user_id').values_list(
+        'user_id', flat=True
+    )
+    last = 0
+    while recipes:
+        batch = list(followers.filter(user_id__gt=last)[:FEED_BATCH_SIZE])
+        if batch:
+            _insert(batch, recipes)
+        if len(batch) < FEED_BATCH_SIZE:
+            return
+        last = batch[-1]
+
+
+def follow_author(user_id, author_id):
+    recipes = latest_recipes(author_id)
+    if recipes:
+        _insert([user_id], recipes)
+
+
+def unfollow_author(user_id, author_id):
+    FeedItem.objects.filter(
+        user=user_id, recipe__author=author_id
+    ).delete()
+
+
+def fan_out_resumed(old_followers, new_followers):
+    """Автор опустился до порога FEED_FANOUT_MAX_FOLLOWERS: его рецепты
+    больше не читаются при чтении ленты и должны быть разложены."""
+    return old_followers > settings.FEED_FANOUT_MAX_FOLLOWERS >= new_followers
+
+
+def schedule_backfill(author_ids):
+    """Отмечает авторов для backfill_outdated_feeds: раскладка до
+    FEED_BACKFILL_RECIPES рецептов каждому из подписчиков слишком долгая
+    для запроса, в котором отписались."""
+    User.objects.filter(pk__in=author_ids).update(feed_outdated=True)
+
+
+def backfill_author(author_id):
+    """Раскладывает последние рецепты автора всем подписчикам: рецепты,
+    опубликованные, пока лента дополнялась при чтении, иначе пропали бы.
+    Записи, оставшиеся с прошлой раскладки, не дублируются."""
+    fan_out(author_id, latest_recipes(author_id))
+
+
+def backfill_outdated_feeds():
+    """Раскладывает рецепты отмеченных авторов. Отметки снимаются до
+    раскладки: отмеченные во время неё обработает следующий запуск.
+    Возвращает число авторов."""
+    author_ids = list(
+        User.objects.filter(feed_outdated=True).values_list('pk', flat=True)
+    )
+    User.objects.filter(pk__in=author_ids).update(feed_outdated=False)
+    for author_id in author_ids:
+        backfill_author(author_id)
+    return len(author_ids)
+
+
+def rebuild_feeds(user_ids=None):
+    """Пересобирает ленты пользователей по подпискам; без user_ids — все."""
+    items = FeedItem.objects.all()
+    follows = _pushed(Follow.objects.all(), 'author')
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        items = items.filter(user__in=user_ids)
+        follows = follows.filter(user__in=user_ids)
+    items.delete()
+    if user_ids is None:
+        User.objects.filter(feed_outdated=True).update(feed_outdated=False)
+    authors = follows.order_by().values_list('author', flat=True).distinct()
+    for author_id in list(authors):
+        fan_out(author_id, latest_recipes(author_id), user_ids)
+
+
+def feed_querysets(user):
+    """Выборки ленты с одинаковыми полями pub_date и recipe_id: записи
+    ленты пользователя и рецепты авторов, которые читаются при чтении."""
+    querysets = [
+        FeedItem.objects.filter(user=user).values('pub_date', 'recipe_id')
+    ]
+    pulled = list(Follow.objects.filter(
+        user=user,
+        author__followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).values_list('author', flat=True))
+    if pulled:
+        querysets.append(
+            Recipe.objects.filter(author__in=pulled)
+            .values('pub_date', recipe_id=F('id'))
+        )
+    return querysets
@@ -1,14 +1,43 @@
 import base64
 
+from django.conf import settings
 from django.core.files.base import ContentFile
+from PIL import Image
 from rest_framework import serializers
 
 
 class Base64ImageField(serializers.ImageField):
     """Добавление изображений к рецептам"""
+    default_error_messages = {
+        'too_large': 'Размер изображения больше {max_size} байт.',
+        'too_many_pixels': 'Изображение больше {max_pixels} пикселей.',
+    }
+
     def to_internal_value(self, data):
+        max_size = settings.RECIPE_IMAGE_MAX_BYTES
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
+            # Размер проверяется до декодирования: 4 символа — 3 байта.
+            if len(imgstr) * 3 // 4 > max_size:
+                self.fail('too_large', max_size=max_size)
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+        if getattr(data, 'size', 0) > max_size:
+            self.fail('too_large', max_size=max_size)
+        self._check_pixels(data)
         return super().to_internal_value(data)
+
+    def _check_pixels(self, data):
+        """Pillow читает только заголовок, пиксели не декодируются."""
+        max_pixels = settings.RECIPE_IMAGE_MAX_PIXELS
+        try:
+            with Image.open(data) as image:
+                width, height = image.size
+        except Exception:
+            # Некорректный файл отклонит проверка родительского класса.
+            return
+        finally:
+            if hasattr(data, 'seek'):
+                data.seek(0)
+        if width * height > max_pixels:
+            self.fail('too_many_pixels', max_pixels=max_pixels)
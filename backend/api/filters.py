@@ -1,7 +1,10 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import BaseFilterBackend, SearchFilter
 
 from administration.models import Ingredient, Tag
+from api.relations import filter_by_ids, get_relations
+from api.search import search_recipes
 from cook.models import Recipe
 
 
@@ -17,11 +20,25 @@ class IngredientSearchFilter(SearchFilter):
     search_param = 'name'
 
 
+class RecipeSearchFilter(BaseFilterBackend):
+    """Полнотекстовый поиск по ?search=, сортирует по релевантности."""
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        return search_recipes(queryset, query)
+
+
 class RecipeFilter(FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
+        method='filter_tags',
+    )
+    tags_mode = filters.ChoiceFilter(
+        choices=(('any', 'any'), ('all', 'all')),
+        method='filter_tags_mode',
     )
     is_favorited = filters.NumberFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.NumberFilter(
@@ -30,14 +47,43 @@ class RecipeFilter(FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',)
+        fields = ('tags', 'tags_mode', 'author', 'is_favorited',
+                  'is_in_shopping_cart',)
+
+    def filter_tags(self, queryset, name, value):
+        """EXISTS по таблице связей вместо JOIN: без дублей и DISTINCT.
+
+        По умолчанию — рецепты с любым из тегов, при tags_mode=all —
+        со всеми тегами сразу.
+        """
+        if not value:
+            return queryset
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk')
+        )
+        if self.form.cleaned_data.get('tags_mode') == 'all':
+            for tag in value:
+                queryset = queryset.filter(
+                    Exists(recipe_tags.filter(tag=tag))
+                )
+            return queryset
+        return queryset.filter(Exists(recipe_tags.filter(tag__in=value)))
+
+    def filter_tags_mode(self, queryset, name, value):
+        return queryset
 
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorites__user=self.request.user)
+            return filter_by_ids(
+                queryset, get_relations(self.request).favorites,
+                favorites__user=self.request.user,
+            )
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(shopping_list__user=self.request.user)
-        return
+            return filter_by_ids(
+                queryset, get_relations(self.request).cart,
+                shopping_list__user=self.request.user,
+            )
+        return queryset
@@ -0,0 +1,125 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image
+
+from cook.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Название варианта: максимальные ширина и высота.
+VARIANT_SIZES = {
+    'thumbnail': (240, 240),
+    'card': (480, 480),
+}
+VARIANTS_DIR = 'variants'
+WEBP_QUALITY = 80
+
+
+def variant_name(name, variant, webp=False):
+    """recipe_images/a.png -> recipe_images/variants/a_card.webp"""
+    directory, filename = os.path.split(name)
+    stem, extension = os.path.splitext(filename)
+    if webp:
+        extension = '.webp'
+    return os.path.join(
+        directory, VARIANTS_DIR, f'{stem}_{variant}{extension}'
+    )
+
+
+def _variant_names(name):
+    for variant in VARIANT_SIZES:
+        for webp in (False, True):
+            yield variant, webp, variant_name(name, variant, webp)
+
+
+def make_variants(media_root, name):
+    """Пишет уменьшенные копии и их WebP-версии рядом с оригиналом.
+
+    Выполняется в отдельном процессе, поэтому работает только с путями
+    и Pillow; готовность отмечает mark_variants_ready в процессе Django.
+    """
+    with Image.open(os.path.join(media_root, name)) as original:
+        original.load()
+        for variant, webp, path in _variant_names(name):
+            path = os.path.join(media_root, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            image = original.copy()
+            image.thumbnail(VARIANT_SIZES[variant])
+            if webp:
+                options = {'format': 'WEBP', 'quality': WEBP_QUALITY}
+            else:
+                options = {'format': original.format}
+            temporary = f'{path}.tmp'
+            image.save(temporary, **options)
+            os.replace(temporary, path)
+
+
+@lru_cache(maxsize=None)
+def _get_pool():
+    return ProcessPoolExecutor(max_workers=settings.RECIPE_IMAGE_WORKERS)
+
+
+def mark_variants_ready(name):
+    """Варианты готовы для всех рецептов с этим изображением."""
+    Recipe.objects.filter(image=name).update(variants_image=name)
+
+
+def _finish(name):
+    def callback(future):
+        if future.exception() is not None:
+            logger.error(
+                'Не удалось подготовить варианты изображения',
+                exc_info=future.exception(),
+            )
+            return
+        # Колбэк выполняется в служебном потоке пула со своим соединением.
+        close_old_connections()
+        try:
+            mark_variants_ready(name)
+        finally:
+            close_old_connections()
+    return callback
+
+
+def schedule_variants(name):
+    """Запускает обработку в пуле процессов, не блокируя воркер."""
+    if not settings.RECIPE_IMAGE_WORKERS:
+        make_variants(settings.MEDIA_ROOT, name)
+        mark_variants_ready(name)
+        return
+    _get_pool().submit(
+        make_variants, settings.MEDIA_ROOT, name
+    ).add_done_callback(_finish(name))
+
+
+def delete_variants(name):
+    """Удаляет варианты заменённого изображения или изображения удалённого
+    рецепта, если оно больше ни у какого рецепта не используется."""
+    if not name or Recipe.objects.filter(image=name).exists():
+        return
+    for _, _, path in _variant_names(name):
+        default_storage.delete(path)
+
+
+def variant_urls(image_name, variants_image, request):
+    """URL вариантов; пока они не готовы — URL оригинала.
+
+    Готовность берётся из Recipe.variants_image без обращения к
+    хранилищу: это имя изображения, для которого варианты записаны.
+    """
+    if not image_name:
+        return None
+    ready = variants_image == image_name
+    urls = {}
+    for variant, webp, name in _variant_names(image_name):
+        url = default_storage.url(name if ready else image_name)
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        urls[f'{variant}_webp' if webp else variant] = url
+    return urls
@@ -0,0 +1,73 @@
+import threading
+from bisect import bisect_left
+
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db import DatabaseError
+
+from administration.models import Ingredient
+from api.caching import bump_version, get_version
+from api.replicas import read_from_primary
+
+# Символ больше любой буквы: верхняя граница диапазона с общим префиксом.
+PREFIX_END = '\U0010ffff'
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Хранит отсортированные названия в нижнем регистре и готовые к
+    выдаче словари в том же порядке. Поиск по префиксу — два bisect,
+    совпадения по подстроке добавляются после префиксных.
+    Версия индекса — версия справочника ингредиентов в кэше, поэтому
+    изменение ингредиентов в одном процессе заставляет остальные
+    пересобрать индекс.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = ((), ())
+        self._version = None
+
+    def build(self):
+        with self._lock, read_from_primary():
+            version = get_version(Ingredient)
+            rows = sorted(
+                Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit'
+                ),
+                key=lambda row: (row[1].lower(), row[0]),
+            )
+            self._data = (
+                tuple(name.lower() for _, name, _ in rows),
+                tuple(
+                    {'id': pk, 'name': name, 'measurement_unit': unit}
+                    for pk, name, unit in rows
+                ),
+            )
+            self._version = version
+
+    def warm_up(self):
+        """Сборка при старте; без базы индекс соберётся при первом запросе."""
+        try:
+            self.build()
+        except (DatabaseError, SynchronousOnlyOperation):
+            self._version = None
+
+    def invalidate(self):
+        self._version = None
+        bump_version(Ingredient)
+
+    def search(self, query):
+        if self._version is None or self._version != get_version(Ingredient):
+            self.build()
+        names, items = self._data
+        query = query.lower()
+        start = bisect_left(names, query)
+        end = bisect_left(names, query + PREFIX_END, start)
+        return list(items[start:end]) + [
+            item for index, (name, item) in enumerate(zip(names, items))
+            if (index < start or index >= end) and query in name
+        ]
+
+
+ingredient_index = IngredientIndex()
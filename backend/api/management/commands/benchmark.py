@@ -0,0 +1,84 @@
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from api.benchmarks import (BUDGETS_FILE, check_budgets, load_budgets,
+                            run_benchmarks, save_budgets, seed_dataset)
+
+
+class Command(BaseCommand):
+    help = 'measure query count, latency and memory of every api endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--favorites', type=int, default=20000)
+        parser.add_argument('--carts', type=int, default=5000)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--only', nargs='*',
+                            help='endpoint names to measure')
+        parser.add_argument('--budgets', default=BUDGETS_FILE)
+        parser.add_argument('--write-budgets', action='store_true',
+                            help='store current results as the new budget')
+        parser.add_argument('--check-latency', action='store_true',
+                            help='also check p95 latency relative to the '
+                                 'baseline endpoint')
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, keepdb=options['keepdb'])
+        old_config = runner.setup_databases()
+        # Загруженные при замерах картинки не должны попадать в media.
+        # Варианты картинок готовятся в запросе: колбэк пула в другом
+        # потоке попадал бы в подсчёт запросов через общее соединение
+        # с тестовой базой в памяти в случайный момент.
+        media_root = tempfile.TemporaryDirectory()
+        media_settings = override_settings(
+            MEDIA_ROOT=media_root.name, RECIPE_IMAGE_WORKERS=0
+        )
+        media_settings.enable()
+        try:
+            self.stdout.write('Заполнение базы...')
+            bench_user = seed_dataset(
+                users=options['users'],
+                recipes=options['recipes'],
+                favorites=options['favorites'],
+                carts=options['carts'],
+                follows=options['follows'],
+            )
+            results = run_benchmarks(
+                bench_user, options['iterations'], options['only']
+            )
+        finally:
+            media_settings.disable()
+            media_root.cleanup()
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+        self.stdout.write(
+            f'{"endpoint":<45}{"status":>7}{"queries":>9}'
+            f'{"p50 ms":>9}{"p95 ms":>9}{"p95 x":>8}{"peak KB":>10}'
+        )
+        for key, value in results.items():
+            self.stdout.write(
+                f'{key:<45}{value["status"]:>7}{value["queries"]:>9}'
+                f'{value["p50_ms"]:>9}{value["p95_ms"]:>9}'
+                f'{value["p95_ratio"]:>8}{value["peak_kb"]:>10}'
+            )
+        if options['write_budgets']:
+            save_budgets(results, options['budgets'])
+            self.stdout.write(f'Бюджет записан в {options["budgets"]}')
+            return
+        failures = check_budgets(
+            results, load_budgets(options['budgets']),
+            options['check_latency'],
+        )
+        if failures:
+            raise CommandError(
+                'Превышен бюджет:\n' + '\n'.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS('Бюджет соблюдён'))
@@ -0,0 +1,142 @@
+import http.client
+import math
+import socket
+import statistics
+import subprocess
+import threading
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# (название, приложение, дополнительные параметры gunicorn)
+SERVERS = (
+    ('wsgi', 'foodgram.wsgi:application', ()),
+    ('asgi', 'foodgram.asgi:application',
+     ('--worker-class', 'uvicorn.workers.UvicornWorker')),
+)
+PATHS = ('/api/recipes/', '/api/tags/', '/api/ingredients/?name=сах')
+STARTUP_TIMEOUT = 30
+SLOW_CLIENT_LINES = 100
+SLOW_CLIENT_DELAY = 0.5
+
+
+def _wait_for_port(host, port, process):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError('Сервер завершился при запуске')
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError('Сервер не запустился')
+
+
+def _load(host, port, paths, stop, timings, errors):
+    """Запросы по кругу до сигнала остановки, новое соединение на каждый."""
+    index = 0
+    while not stop.is_set():
+        path = paths[index % len(paths)]
+        index += 1
+        start = time.perf_counter()
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=30)
+            connection.request('GET', path, headers={'Connection': 'close'})
+            response = connection.getresponse()
+            response.read()
+            connection.close()
+        except OSError:
+            response = None
+        if stop.is_set():
+            return
+        if response is None or response.status >= 500:
+            errors.append(path)
+            continue
+        timings.append((time.perf_counter() - start) * 1000)
+
+
+def _slow_client(host, port, stop):
+    """Медленный клиент: запрос приходит по одной строке заголовка."""
+    while not stop.is_set():
+        try:
+            with socket.create_connection((host, port), timeout=30) as sock:
+                sock.sendall(b'POST /api/recipes/ HTTP/1.1\r\n')
+                for index in range(SLOW_CLIENT_LINES):
+                    if stop.wait(SLOW_CLIENT_DELAY):
+                        return
+                    sock.sendall(f'X-Slow-{index}: 1\r\n'.encode())
+        except OSError:
+            stop.wait(SLOW_CLIENT_DELAY)
+
+
+class Command(BaseCommand):
+    help = ('compare throughput of wsgi and asgi gunicorn workers '
+            'on the configured database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--slow-clients', type=int, default=0,
+                            help='connections sending a request slowly')
+        parser.add_argument('--paths', nargs='*', default=PATHS)
+        parser.add_argument('--bind', default='127.0.0.1:8765')
+
+    def handle(self, *args, **options):
+        host, port = options['bind'].rsplit(':', 1)
+        port = int(port)
+        paths = [quote(path, safe='/?=&') for path in options['paths']]
+        self.stdout.write(
+            f'{"server":<8}{"requests":>10}{"req/s":>10}'
+            f'{"p50 ms":>10}{"p95 ms":>10}{"errors":>8}'
+        )
+        for name, application, extra in SERVERS:
+            timings, errors = self.run_server(
+                application, extra, host, port, paths, options
+            )
+            ordered = sorted(timings) or [0.0]
+            self.stdout.write(
+                f'{name:<8}{len(timings):>10}'
+                f'{len(timings) / options["duration"]:>10.1f}'
+                f'{statistics.median(ordered):>10.1f}'
+                f'{ordered[math.ceil(len(ordered) * 0.95) - 1]:>10.1f}'
+                f'{len(errors):>8}'
+            )
+
+    def run_server(self, application, extra, host, port, paths, options):
+        process = subprocess.Popen(
+            ['gunicorn', application,
+             '--workers', str(options['workers']),
+             '--bind', f'{host}:{port}',
+             '--chdir', settings.BASE_DIR,
+             '--log-level', 'error',
+             *extra],
+        )
+        stop = threading.Event()
+        timings, errors = [], []
+        threads = [
+            threading.Thread(target=_slow_client, args=(host, port, stop))
+            for _ in range(options['slow_clients'])
+        ] + [
+            threading.Thread(
+                target=_load,
+                args=(host, port, paths, stop, timings, errors),
+            )
+            for _ in range(options['concurrency'])
+        ]
+        try:
+            _wait_for_port(host, port, process)
+            for thread in threads:
+                thread.start()
+            time.sleep(options['duration'])
+        finally:
+            stop.set()
+            process.terminate()
+            process.wait()
+            for thread in threads:
+                if thread.is_alive():
+                    thread.join()
+        return timings, errors
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.similarity import (METRICS, SIMILAR_MAX_PAIRS, SIMILAR_TOP_K,
+                            build_similar_recipes)
+
+
+class Command(BaseCommand):
+    help = ('compute the most similar recipes by ingredients for '
+            '/api/recipes/{id}/similar/')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=SIMILAR_TOP_K,
+                            help='similar recipes stored per recipe')
+        parser.add_argument('--metric', choices=METRICS, default='cosine')
+        parser.add_argument('--max-pairs', type=int,
+                            default=SIMILAR_MAX_PAIRS,
+                            help='recipe pairs with common ingredients per '
+                                 'batch, bounds memory')
+        parser.add_argument('--changed', action='store_true',
+                            help='only recipes whose ingredients changed '
+                                 'and the lists they affect; use the same '
+                                 'top-k and metric as the full run')
+
+    def handle(self, *args, **options):
+        if options['top_k'] < 1 or options['max_pairs'] < 1:
+            raise CommandError('--top-k и --max-pairs должны быть больше 0')
+        started = time.perf_counter()
+        recipes, pairs = build_similar_recipes(
+            top_k=options['top_k'],
+            metric=options['metric'],
+            max_pairs=options['max_pairs'],
+            changed_only=options['changed'],
+        )
+        self.stdout.write(
+            f'Рецептов пересчитано: {recipes}, пар записано: {pairs} '
+            f'за {time.perf_counter() - started:.1f} с'
+        )
@@ -0,0 +1,215 @@
+import json
+import tempfile
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from administration.models import Ingredient, Tag
+from api.benchmarks import seed_dataset
+from api.renderers import FastJSONRenderer
+from api.representations import recipe_representations, recipe_rows
+from api.serializers import RecipeSerializer
+from cook.models import IngredientRecipe, Recipe
+from users.models import User
+
+# Строки, которые JSON-кодировщики экранируют по-разному.
+TRICKY_TEXT = 'Кавычки " \\ / </script>\n\t\x01\x1f\x7f \u2028\u2029 🍲'
+URLS = (
+    '/api/recipes/',
+    '/api/recipes/?limit=50&page=2',
+    '/api/recipes/?tags=breakfast&tags=dinner',
+    '/api/recipes/?tags=breakfast&tags=lunch&tags_mode=all',
+    '/api/recipes/?is_favorited=1',
+    '/api/recipes/?is_in_shopping_cart=1&limit=100',
+    '/api/recipes/?author={author}',
+    '/api/recipes/?search=рецепт',
+    '/api/recipes/?pagination=cursor&count=1',
+    '/api/recipes/{tricky}/',
+    '/api/recipes/{recipe}/',
+)
+
+
+def _serializer_json(recipe_ids, request):
+    recipes = Recipe.objects.for_serialization().in_bulk(recipe_ids)
+    return RecipeSerializer(
+        [recipes[pk] for pk in recipe_ids], many=True,
+        context={'request': request},
+    ).data
+
+
+def _tricky_recipe(user):
+    user.first_name = TRICKY_TEXT[:60]
+    user.save()
+    recipe = Recipe.objects.create(
+        author=user, name=TRICKY_TEXT, title='tricky', text=TRICKY_TEXT * 3,
+        cooking_time=1, image='recipe_images/temp.png',
+    )
+    recipe.tags.set(Tag.objects.all())
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(recipe=recipe, ingredient=ingredient, amount=1)
+        for ingredient in Ingredient.objects.order_by('-id')[:5]
+    )
+    return recipe
+
+
+class Command(BaseCommand):
+    help = ('check that the fast recipe representations render byte for '
+            'byte like RecipeSerializer and compare their throughput')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=300)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--favorites', type=int, default=5000)
+        parser.add_argument('--carts', type=int, default=1000)
+        parser.add_argument('--follows', type=int, default=2000)
+        parser.add_argument('--page-size', type=int, default=100,
+                            help='recipes per page in the throughput test')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, keepdb=options['keepdb'])
+        old_config = runner.setup_databases()
+        media_root = tempfile.TemporaryDirectory()
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        try:
+            self.stdout.write('Заполнение базы...')
+            bench_user = seed_dataset(
+                users=options['users'],
+                recipes=options['recipes'],
+                favorites=options['favorites'],
+                carts=options['carts'],
+                follows=options['follows'],
+            )
+            tricky = _tricky_recipe(
+                User.objects.exclude(pk=bench_user.pk).first()
+            )
+            mismatches = self.compare_all(bench_user)
+            self.compare_endpoints(bench_user, tricky, mismatches)
+            self.throughput(bench_user, options)
+        finally:
+            media_settings.disable()
+            media_root.cleanup()
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+        if mismatches:
+            raise CommandError(f'Расхождений: {len(mismatches)}')
+        self.stdout.write(self.style.SUCCESS('Вывод совпадает байт в байт'))
+
+    def report(self, mismatches, label, expected, actual):
+        if expected == actual:
+            return
+        mismatches.append(label)
+        position = next(
+            (i for i, (a, b) in enumerate(zip(expected, actual)) if a != b),
+            min(len(expected), len(actual)),
+        )
+        self.stdout.write(self.style.ERROR(
+            f'{label}: расхождение с позиции {position}\n'
+            f'  сериализатор: {expected[position - 40:position + 40]!r}\n'
+            f'  быстрый путь: {actual[position - 40:position + 40]!r}'
+        ))
+
+    def compare_all(self, bench_user):
+        """Все рецепты страницами по 100 для анонима и пользователя."""
+        factory = APIRequestFactory()
+        recipe_ids = list(
+            Recipe.objects.order_by('-id').values_list('id', flat=True)
+        )
+        mismatches = []
+        for user in (None, bench_user):
+            for start in range(0, len(recipe_ids), 100):
+                page_ids = recipe_ids[start:start + 100]
+                requests = []
+                for _ in range(2):
+                    request = factory.get('/api/recipes/')
+                    request.user = user or AnonymousUser()
+                    requests.append(request)
+                rows = Recipe.objects.filter(pk__in=page_ids).order_by('-id')
+                self.report(
+                    mismatches, f'{user or "anonymous"} страница {start}',
+                    JSONRenderer().render(
+                        _serializer_json(page_ids, requests[0])
+                    ),
+                    FastJSONRenderer().render(recipe_representations(
+                        list(recipe_rows(rows)), requests[1]
+                    )),
+                )
+        self.stdout.write(
+            f'Рецептов проверено: {len(recipe_ids)} x 2 пользователя'
+        )
+        return mismatches
+
+    def compare_endpoints(self, bench_user, tricky, mismatches):
+        """Ответы API против RecipeSerializer для тех же рецептов."""
+        factory = APIRequestFactory()
+        anonymous, user = APIClient(), APIClient()
+        user.force_authenticate(bench_user)
+        for client, request_user in ((anonymous, None), (user, bench_user)):
+            for url in URLS:
+                url = url.format(
+                    author=tricky.author_id, tricky=tricky.pk,
+                    recipe=Recipe.objects.order_by('id').first().pk,
+                )
+                response = client.get(url)
+                request = factory.get(url)
+                request.user = request_user or AnonymousUser()
+                data = json.loads(response.content)
+                if 'results' in data:
+                    data['results'] = _serializer_json(
+                        [item['id'] for item in data['results']], request
+                    )
+                else:
+                    data = _serializer_json([data['id']], request)[0]
+                self.report(
+                    mismatches, f'{request_user or "anonymous"} GET {url}',
+                    JSONRenderer().render(data), response.content,
+                )
+        self.stdout.write(f'Эндпоинтов проверено: {len(URLS)} x 2')
+
+    def throughput(self, bench_user, options):
+        factory = APIRequestFactory()
+        page_ids = list(
+            Recipe.objects.order_by('-id')
+            .values_list('id', flat=True)[:options['page_size']]
+        )
+
+        def serializer_path(request):
+            return JSONRenderer().render(_serializer_json(page_ids, request))
+
+        def fast_path(request):
+            rows = Recipe.objects.filter(pk__in=page_ids).order_by('-id')
+            return FastJSONRenderer().render(
+                recipe_representations(list(recipe_rows(rows)), request)
+            )
+
+        timings = {}
+        for name, path in (('сериализатор', serializer_path),
+                           ('быстрый путь', fast_path)):
+            started = time.perf_counter()
+            for _ in range(options['iterations']):
+                request = factory.get('/api/recipes/')
+                request.user = bench_user
+                path(request)
+            timings[name] = time.perf_counter() - started
+        recipes = options['iterations'] * len(page_ids)
+        self.stdout.write(
+            f'\nСтраница {len(page_ids)} рецептов, '
+            f'{options["iterations"]} повторов:'
+        )
+        for name, seconds in timings.items():
+            self.stdout.write(
+                f'  {name:<14}{recipes / seconds:>10.0f} рецептов/с'
+            )
+        self.stdout.write(
+            f'  ускорение: '
+            f'{timings["сериализатор"] / timings["быстрый путь"]:.1f}x'
+        )
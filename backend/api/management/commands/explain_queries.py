@@ -0,0 +1,73 @@
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from api.benchmarks import seed_dataset
+from api.query_plans import analyze, capture_statements
+
+SQL_PREVIEW = 300
+
+
+class Command(BaseCommand):
+    help = ('replay every api endpoint, explain its sql and suggest '
+            'indexes for scans and sorts on large tables')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--favorites', type=int, default=20000)
+        parser.add_argument('--carts', type=int, default=5000)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument('--only', nargs='*',
+                            help='endpoint names to replay')
+        parser.add_argument('--min-rows', type=int, default=1000,
+                            help='ignore tables smaller than this')
+        parser.add_argument('--fail-on-suggestions', action='store_true',
+                            help='exit with an error if indexes are missing')
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, keepdb=options['keepdb'])
+        old_config = runner.setup_databases()
+        media_root = tempfile.TemporaryDirectory()
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        try:
+            self.stdout.write('Заполнение базы...')
+            bench_user = seed_dataset(
+                users=options['users'],
+                recipes=options['recipes'],
+                favorites=options['favorites'],
+                carts=options['carts'],
+                follows=options['follows'],
+            )
+            statements = capture_statements(bench_user, options['only'])
+            report = analyze(statements, options['min_rows'])
+        finally:
+            media_settings.disable()
+            media_root.cleanup()
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+        self.stdout.write(
+            f'Запросов: {len(statements)}, замечаний: {len(report)}'
+        )
+        suggestions = {}
+        for sql, endpoints, kind, detail, index in report:
+            self.stdout.write(f'\n[{kind}] {detail}')
+            self.stdout.write(f'  эндпоинты: {", ".join(endpoints)}')
+            self.stdout.write(f'  {sql[:SQL_PREVIEW]}')
+            if index:
+                self.stdout.write(self.style.WARNING(f'  индекс: {index}'))
+                suggestions.setdefault(index, set()).update(endpoints)
+        if not suggestions:
+            self.stdout.write(self.style.SUCCESS('\nНовых индексов не нужно'))
+            return
+        self.stdout.write('\nПредлагаемые индексы:')
+        for index, endpoints in suggestions.items():
+            self.stdout.write(f'  {index}  ({len(endpoints)} эндпоинтов)')
+        if options['fail_on_suggestions']:
+            raise CommandError('Есть запросы без подходящего индекса')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.feed import backfill_outdated_feeds, rebuild_feeds
+
+
+class Command(BaseCommand):
+    help = 'rebuild recipe feeds from subscriptions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--outdated', action='store_true',
+                            help='only add recent recipes of authors who '
+                                 'dropped to the fan-out follower limit')
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        if options['outdated']:
+            authors = backfill_outdated_feeds()
+            self.stdout.write(f'Ленты дополнены рецептами авторов: {authors}')
+            return
+        rebuild_feeds()
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from api.search import update_search_documents
+
+
+class Command(BaseCommand):
+    help = 'rebuild full-text search documents of all recipes'
+
+    def handle(self, *args, **options):
+        update_search_documents()
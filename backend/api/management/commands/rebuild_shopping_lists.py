@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.shopping_list import rebuild_shopping_lists
+
+
+class Command(BaseCommand):
+    help = 'rebuild aggregated shopping lists from shopping carts'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        rebuild_shopping_lists()
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.counters import reconcile_counters
+from api.feed import backfill_outdated_feeds
+
+
+class Command(BaseCommand):
+    help = 'recalculate denormalized favorites, carts and recipes counters'
+
+    def handle(self, *args, **options):
+        results = reconcile_counters()
+        for counter, fixed in results.items():
+            self.stdout.write(f'{counter}: исправлено {fixed}')
+        authors = backfill_outdated_feeds()
+        if authors:
+            self.stdout.write(f'Ленты дополнены рецептами авторов: {authors}')
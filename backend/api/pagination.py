@@ -1,6 +1,178 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from functools import reduce
+from operator import itemgetter, or_
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class KeysetPagination(BasePagination):
+    """Постраничный вывод по ключу последней записи вместо OFFSET.
+
+    Курсор хранит значения полей сортировки последней записи страницы,
+    следующая страница — записи строго после неё. Порядок стабилен при
+    добавлении новых записей, COUNT выполняется только по ?count=1.
+    Сортировка берётся из атрибута keyset_ordering представления,
+    последнее поле должно быть уникальным.
+    """
+    page_size = CustomPagination.page_size
+    page_size_query_param = CustomPagination.page_size_query_param
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Некорректный курсор'
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return page_size if page_size > 0 else self.page_size
+
+    def _fields(self):
+        return [
+            (name.lstrip('-'), name.startswith('-')) for name in self.ordering
+        ]
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self._fields(), values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance):
+        values = []
+        for name, _ in self._fields():
+            # Страница может состоять из строк values().
+            if isinstance(instance, dict):
+                value = instance[name]
+            else:
+                value = getattr(instance, name)
+            values.append(
+                value.isoformat() if hasattr(value, 'isoformat') else value
+            )
+        return base64.urlsafe_b64encode(
+            json.dumps(values).encode()
+        ).decode()
+
+    def _after(self, values):
+        """(a, b) после (x, y): a > x или a = x и b > y (для DESC — <)."""
+        conditions = []
+        fields = self._fields()
+        for index, (name, descending) in enumerate(fields):
+            lookup = 'lt' if descending else 'gt'
+            equal = {
+                prefix: value
+                for (prefix, _), value in zip(fields[:index], values)
+            }
+            conditions.append(
+                Q(**equal, **{f'{name}__{lookup}': values[index]})
+            )
+        return reduce(or_, conditions)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        self.count = None
+        if request.query_params.get(self.count_query_param) == '1':
+            self.count = queryset.count()
+        values = self.decode_cursor(request, queryset.model)
+        if values is not None:
+            queryset = queryset.filter(self._after(values))
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(),
+            CustomPagination.page_query_param,
+        )
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.last)
+        )
+
+    def get_paginated_response(self, data):
+        response = {'next': self.get_next_link(), 'previous': None}
+        if self.count is not None:
+            response['count'] = self.count
+        response['results'] = data
+        return Response(response)
+
+
+class OptionalKeysetPagination(CustomPagination):
+    """Номера страниц по умолчанию, курсор — по ?pagination=cursor."""
+    mode_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        ordering = getattr(view, 'keyset_ordering', None)
+        if ordering and request.query_params.get(
+            self.mode_query_param
+        ) == 'cursor':
+            self.keyset = KeysetPagination(ordering)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class MergedKeysetPagination(KeysetPagination):
+    """Курсор по нескольким выборкам строк values() с полями сортировки.
+
+    Каждая выборка читается своим диапазоном индекса не дальше одной
+    страницы, страницы сливаются в общем порядке. Строки с одинаковым
+    последним полем сортировки считаются повтором. COUNT не выполняется.
+    """
+
+    def paginate_queryset(self, querysets, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        values = self.decode_cursor(request, querysets[0].model)
+        rows = []
+        for queryset in querysets:
+            queryset = queryset.order_by(*self.ordering)
+            if values is not None:
+                queryset = queryset.filter(self._after(values))
+            rows.extend(queryset[:self.page_size + 1])
+        for name, descending in reversed(self._fields()):
+            rows.sort(key=itemgetter(name), reverse=descending)
+        unique, _ = self._fields()[-1]
+        page, seen = [], set()
+        for row in rows:
+            if row[unique] not in seen:
+                seen.add(row[unique])
+                page.append(row)
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.last = page[-1] if page else None
+        return page
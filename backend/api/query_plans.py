@@ -0,0 +1,249 @@
+import json
+import logging
+import re
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import connection
+
+from api.benchmarks import bench_session, endpoint_requests
+
+EXPLAINED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+# Django называет повторные и вложенные таблицы T3, U0, V0.
+TABLE_REF = re.compile(r'(?:FROM|JOIN) "(\w+)"(?: ([A-Z]\d+)\b)?')
+COLUMN_REF = r'"{}"\."(\w+)"'
+CLAUSE_END = re.compile(r' (?:GROUP BY|ORDER BY|LIMIT|HAVING) ')
+EQUALITY = r'\s*(?:=|IN\b|IS NULL)'
+RANGE = r'\s*(?:>|<|LIKE\b|BETWEEN\b)'
+
+
+class Finding:
+    """Проблема в плане запроса: вид, таблица, строка плана."""
+
+    def __init__(self, kind, alias, detail):
+        self.kind = kind
+        self.alias = alias
+        self.detail = detail
+
+
+def capture_statements(bench_user, only=None):
+    """SQL всех эндпоинтов: {sql: (параметры, {эндпоинты})}.
+
+    Одинаковый текст с разными параметрами — один запрос, план берётся
+    по первым параметрам.
+    """
+    state = {'endpoint': None, 'statements': {}}
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+
+    def record(execute, sql, params, many, context):
+        if state['endpoint'] and not many and (
+            sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS)
+        ):
+            _, endpoints = state['statements'].setdefault(
+                sql, (params, set())
+            )
+            endpoints.add(state['endpoint'])
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(record):
+        for role, name, send in endpoint_requests(
+            bench_session(bench_user), only
+        ):
+            state['endpoint'] = f'{role} {name}'
+            send()
+    return state['statements']
+
+
+def _sqlite_findings(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        rows = cursor.fetchall()
+    # Просмотр в порядке индекса или первичного ключа с LIMIT и без
+    # сортировки во временном дереве останавливается на первой странице.
+    early_stop = ' LIMIT ' in sql and not any(
+        'TEMP B-TREE FOR ORDER BY' in row[3] for row in rows
+    )
+    findings = []
+    # Соединения в SQLite — всегда вложенные циклы: полный просмотр
+    # таблицы внутри цикла по другой таблице повторяется для каждой строки.
+    loops = defaultdict(int)
+    for _, parent, _, detail in rows:
+        access = re.match(r'(SCAN|SEARCH) (\w+)', detail)
+        if access:
+            kind, alias = access.groups()
+            if kind == 'SCAN' and 'COVERING INDEX' not in detail:
+                if loops[parent]:
+                    findings.append(Finding('nested loop', alias, detail))
+                elif not early_stop:
+                    findings.append(Finding('seq scan', alias, detail))
+            loops[parent] += 1
+        elif detail.startswith('USE TEMP B-TREE'):
+            findings.append(Finding('temp sort', None, detail))
+    return findings
+
+
+def _postgresql_findings(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    def walk(node, inner=False):
+        node_type = node['Node Type']
+        if node_type == 'Seq Scan':
+            yield Finding(
+                'nested loop' if inner else 'seq scan',
+                node.get('Alias', node['Relation Name']),
+                f'{node_type} on {node["Relation Name"]}',
+            )
+        elif node_type in ('Sort', 'Incremental Sort'):
+            yield Finding(
+                'temp sort', None,
+                f'{node_type} by {", ".join(node.get("Sort Key", ()))}',
+            )
+        for index, child in enumerate(node.get('Plans', ())):
+            yield from walk(
+                child, inner=node_type == 'Nested Loop' and index > 0
+            )
+
+    return list(walk(plan[0]['Plan']))
+
+
+EXPLAIN = {
+    'sqlite': _sqlite_findings,
+    'postgresql': _postgresql_findings,
+}
+
+
+def _tables(sql):
+    """Псевдонимы таблиц запроса: {псевдоним или имя: таблица}."""
+    tables = {}
+    for table, alias in TABLE_REF.findall(sql):
+        tables[alias or table] = table
+    return tables
+
+
+def _order_clause(sql):
+    return sql.rsplit(' ORDER BY ', 1)[1] if ' ORDER BY ' in sql else ''
+
+
+def _columns(text, alias, operator):
+    return re.findall(COLUMN_REF.format(alias) + operator, text)
+
+
+def suggest_columns(sql, alias, primary_key='id', inner=False):
+    """Колонки составного индекса для таблицы alias: сначала условия
+    равенства (и соединения, если таблица во внутреннем цикле), затем
+    диапазон или порядок сортировки. Для поиска по первичному ключу
+    индекс не нужен — пустой список."""
+    where = sql.split(' WHERE ', 1)[1] if ' WHERE ' in sql else ''
+    where = CLAUSE_END.split(where, 1)[0]
+    equality = _columns(where, alias, EQUALITY)
+    if inner:
+        joins = ' '.join(re.findall(r' ON \(([^)]*)\)', sql))
+        equality += _columns(joins, alias, r'\s*=') + re.findall(
+            r'=\s*' + COLUMN_REF.format(alias), joins
+        )
+    if primary_key in equality:
+        return []
+    columns = []
+    for column in equality:
+        if column not in columns:
+            columns.append(column)
+    ordering = [
+        ('-' if direction == 'DESC' else '') + column
+        for column, direction in re.findall(
+            COLUMN_REF.format(alias) + r' (ASC|DESC)', _order_clause(sql)
+        ) if column not in columns
+    ]
+    if ordering:
+        return columns + ordering
+    ranges = [
+        column for column in _columns(where, alias, RANGE)
+        if column not in columns
+    ]
+    return columns + ranges[:1]
+
+
+def _indexed(table, columns):
+    """Есть ли индекс, который начинается с этих колонок, или уникальный
+    индекс по их началу: после него остальные колонки не нужны."""
+    names = [column.lstrip('-') for column in columns]
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return any(
+        (constraint['index'] or constraint['unique'])
+        and constraint['columns'][:len(names)] == names
+        or constraint['unique']
+        and names[:len(constraint['columns'])] == constraint['columns']
+        for constraint in constraints.values()
+    )
+
+
+def _table_sizes():
+    sizes = {}
+    with connection.cursor() as cursor:
+        for model in apps.get_models():
+            table = model._meta.db_table
+            cursor.execute(f'SELECT COUNT(*) FROM "{table}"')
+            sizes[table] = cursor.fetchone()[0]
+    return sizes
+
+
+def _model(table):
+    return next(
+        (m for m in apps.get_models() if m._meta.db_table == table), None
+    )
+
+
+def _index_definition(table, columns):
+    """Индекс в виде models.Index для модели таблицы."""
+    model = _model(table)
+    if model is None:
+        return f'{table} ({", ".join(columns)})'
+    fields = {field.column: field.name for field in model._meta.fields}
+    names = [
+        ('-' if column.startswith('-') else '')
+        + fields.get(column.lstrip('-'), column.lstrip('-'))
+        for column in columns
+    ]
+    return f'{model._meta.label}: models.Index(fields={names!r})'
+
+
+def analyze(statements, min_rows=1000):
+    """Проблемные планы на таблицах от min_rows строк.
+
+    Возвращает список (sql, эндпоинты, вид, строка плана, индекс или None).
+    """
+    explain = EXPLAIN.get(connection.vendor)
+    if explain is None:
+        return []
+    sizes = _table_sizes()
+    report = []
+    for sql, (params, endpoints) in statements.items():
+        tables = _tables(sql)
+        for finding in explain(sql, params):
+            # Сортировка относится к таблицам из ORDER BY.
+            aliases = [finding.alias] if finding.alias else [
+                alias for alias in tables
+                if _columns(_order_clause(sql), alias, ' ')
+            ]
+            for alias in aliases or [None]:
+                table = tables.get(alias, alias)
+                if sizes.get(table, 0) < min_rows:
+                    continue
+                model = _model(table)
+                columns = suggest_columns(
+                    sql, alias,
+                    primary_key=model._meta.pk.column if model else 'id',
+                    inner=finding.kind == 'nested loop',
+                )
+                index = None
+                if columns and not _indexed(table, columns):
+                    index = _index_definition(table, columns)
+                report.append((
+                    sql, sorted(endpoints), finding.kind,
+                    f'{table}: {finding.detail}', index,
+                ))
+    return report
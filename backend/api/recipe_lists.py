@@ -0,0 +1,48 @@
+from django.db import connection
+
+# Возвращают id рецептов, строки которых действительно вставлены или
+# удалены: параллельный запрос того же пользователя не даст изменить
+# счётчики и список покупок дважды. RETURNING понимают PostgreSQL
+# и SQLite с версии 3.35.
+INSERT_SQL = (
+    'INSERT INTO {table} (user_id, recipe_id) VALUES {values} '
+    'ON CONFLICT (user_id, recipe_id) DO NOTHING RETURNING recipe_id'
+)
+DELETE_SQL = (
+    'DELETE FROM {table} WHERE user_id = %s '
+    'AND recipe_id IN ({placeholders}) RETURNING recipe_id'
+)
+
+
+def _returned_ids(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [recipe_id for recipe_id, in cursor.fetchall()]
+
+
+def add_recipes(model, user_id, recipe_ids):
+    """Добавляет рецепты в список model (Favorite или ShoppingCart) одним
+    INSERT; возвращает id добавленных, без тех, что уже были в списке."""
+    if not recipe_ids:
+        return []
+    return _returned_ids(
+        INSERT_SQL.format(
+            table=model._meta.db_table,
+            values=', '.join(['(%s, %s)'] * len(recipe_ids)),
+        ),
+        [value for pk in recipe_ids for value in (user_id, pk)],
+    )
+
+
+def remove_recipes(model, user_id, recipe_ids):
+    """Удаляет рецепты из списка model одним DELETE без сигналов на каждую
+    строку; возвращает id удалённых."""
+    if not recipe_ids:
+        return []
+    return _returned_ids(
+        DELETE_SQL.format(
+            table=model._meta.db_table,
+            placeholders=', '.join(['%s'] * len(recipe_ids)),
+        ),
+        [user_id, *recipe_ids],
+    )
@@ -0,0 +1,69 @@
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from api.replicas import read_from_primary
+from print.models import Favorite, ShoppingCart
+from users.models import Follow
+
+RELATIONS_KEY = 'user_relations:{}'
+# Больше id фильтр по IN не строится: дешевле соединение с таблицей.
+MAX_FILTER_IDS = 1000
+
+
+class UserRelations:
+    """Id избранных рецептов, рецептов в корзине и авторов в подписках."""
+    __slots__ = ('favorites', 'cart', 'follows')
+
+    def __init__(self, favorites=(), cart=(), follows=()):
+        self.favorites = frozenset(favorites)
+        self.cart = frozenset(cart)
+        self.follows = frozenset(follows)
+
+
+EMPTY_RELATIONS = UserRelations()
+
+
+def _load(user_id):
+    """Связи из кэша; в кэше лежат массивы id — компактно при pickle."""
+    key = RELATIONS_KEY.format(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        with read_from_primary():
+            ids = tuple(
+                array('q', sorted(queryset.values_list(field, flat=True)))
+                for queryset, field in (
+                    (Favorite.objects.filter(user=user_id), 'recipe_id'),
+                    (ShoppingCart.objects.filter(user=user_id), 'recipe_id'),
+                    (Follow.objects.filter(user=user_id), 'author_id'),
+                )
+            )
+        cache.set(key, ids, settings.USER_RELATIONS_CACHE_TIMEOUT)
+    return UserRelations(*ids)
+
+
+def get_relations(request):
+    """Связи текущего пользователя, один раз за запрос."""
+    if request is None or request.user.is_anonymous:
+        return EMPTY_RELATIONS
+    relations = getattr(request, '_user_relations', None)
+    if relations is None:
+        relations = _load(request.user.pk)
+        request._user_relations = relations
+    return relations
+
+
+def invalidate_relations(user_id):
+    """Сброс сразу и после коммита, чтобы не закэшировать старые данные."""
+    key = RELATIONS_KEY.format(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def filter_by_ids(queryset, ids, **fallback):
+    """Фильтр по id из кэша или, если их слишком много, по fallback."""
+    if len(ids) > MAX_FILTER_IDS:
+        return queryset.filter(**fallback)
+    return queryset.filter(pk__in=sorted(ids))
@@ -0,0 +1,46 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Подклассы dict, list, str и даты orjson отдаёт в _default: DRF пишет их
+# иначе, чем orjson по умолчанию.
+ORJSON_OPTIONS = (
+    orjson.OPT_PASSTHROUGH_DATETIME
+    | orjson.OPT_PASSTHROUGH_SUBCLASS
+    | orjson.OPT_PASSTHROUGH_DATACLASS
+)
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    for base in (dict, list, str, int):
+        if isinstance(obj, base):
+            return base(obj)
+    return _encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson с тем же выводом байт в байт.
+
+    Отступы, ASCII-вывод и нестрогий JSON, а также всё, что orjson не
+    умеет (например, целые больше 64 бит), рендерит JSONRenderer.
+    Числа с плавающей точкой orjson пишет иначе, поэтому рендерер — для
+    ответов без них.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is None and self.compact and self.strict and (
+            not self.ensure_ascii
+        ):
+            try:
+                return orjson.dumps(
+                    data, default=_default, option=ORJSON_OPTIONS
+                ).replace(
+                    b'\xe2\x80\xa8', b'\\u2028'
+                ).replace(b'\xe2\x80\xa9', b'\\u2029')
+            except orjson.JSONEncodeError:
+                pass
+        return super().render(data, accepted_media_type, renderer_context)
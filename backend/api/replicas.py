@@ -0,0 +1,123 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_KEY = 'replica_pin:{}'
+# Как часто процесс перепроверяет отставание реплик, секунд.
+LAG_CHECK_INTERVAL = 5
+# Отставание в секундах; догнавшая основную базу реплика — ноль, даже
+# если записей давно не было.
+LAG_SQL = {
+    'postgresql': (
+        'SELECT CASE WHEN pg_last_wal_receive_lsn() = '
+        'pg_last_wal_replay_lsn() THEN 0 ELSE EXTRACT(EPOCH FROM '
+        'now() - pg_last_xact_replay_timestamp()) END'
+    ),
+}
+
+_replica = ContextVar('replica', default=None)
+_lock = threading.Lock()
+_checked = {'at': None, 'replicas': []}
+
+
+def _lag(alias):
+    connection = connections[alias]
+    sql = LAG_SQL.get(connection.vendor)
+    if sql is None:
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        lag = cursor.fetchone()[0]
+    return float(lag or 0)
+
+
+def healthy_replicas():
+    """Реплики, отстающие не больше REPLICA_MAX_LAG; недоступные и
+    отстающие пропускаются до следующей проверки."""
+    now = time.monotonic()
+    with _lock:
+        checked = _checked['at']
+        if checked is not None and now - checked < LAG_CHECK_INTERVAL:
+            return _checked['replicas']
+        _checked['at'] = now
+    replicas = []
+    for alias in settings.DATABASE_REPLICAS:
+        try:
+            if _lag(alias) <= settings.REPLICA_MAX_LAG:
+                replicas.append(alias)
+        except DatabaseError:
+            continue
+    _checked['replicas'] = replicas
+    return replicas
+
+
+def pin_to_primary(user):
+    """После записи пользователь читает с основной базы, пока реплики
+    могут её ещё не получить."""
+    if user.is_authenticated:
+        cache.set(PIN_KEY.format(user.pk), True, settings.REPLICA_MAX_LAG)
+
+
+def is_pinned(user):
+    return user.is_authenticated and bool(
+        cache.get(PIN_KEY.format(user.pk))
+    )
+
+
+@contextmanager
+def read_from_primary():
+    """Чтение с основной базы внутри запроса на реплике: для данных,
+    которые кэшируются до следующего изменения и не должны отставать."""
+    token = _replica.set(None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+class ReplicaRouter:
+    """Чтение — с реплики, выбранной для текущего запроса, иначе решает
+    Django (основная база); запись и миграции — только основная база."""
+
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaReadMixin:
+    """Безопасные запросы представления читают с одной из реплик.
+
+    Пользователь определяется ещё на основной базе. Запись закрепляет
+    пользователя за основной базой, чтобы он сразу видел свои изменения.
+    """
+    _replica_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method not in SAFE_METHODS:
+            pin_to_primary(request.user)
+        elif settings.DATABASE_REPLICAS and not is_pinned(request.user):
+            replicas = healthy_replicas()
+            if replicas:
+                self._replica_token = _replica.set(random.choice(replicas))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self._replica_token is not None:
+            _replica.reset(self._replica_token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
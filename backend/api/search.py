@@ -0,0 +1,148 @@
+import re
+import threading
+
+from django.db import connection, transaction
+from django.db.models import FloatField, Q, Value
+
+from administration.models import Ingredient
+from cook.models import IngredientRecipe, Recipe
+
+SEARCH_TABLE = 'cook_recipe_search'
+# Конфигурация PostgreSQL: стемминг русских слов.
+SEARCH_CONFIG = 'russian'
+MAX_QUERY_WORDS = 10
+UPDATE_CHUNK_SIZE = 500
+
+# Документ рецепта: название, названия ингредиентов и описание.
+# В PostgreSQL это веса A, B, C в tsvector, в SQLite — колонки FTS5
+# с весами bm25 в том же порядке.
+DOCUMENT_SOURCE = (
+    f'FROM {Recipe._meta.db_table} r '
+    f'LEFT JOIN {IngredientRecipe._meta.db_table} ir '
+    'ON ir.recipe_id = r.id '
+    f'LEFT JOIN {Ingredient._meta.db_table} i ON i.id = ir.ingredient_id '
+    '{where} GROUP BY r.id, r.name, r.text'
+)
+INSERT_SQL = {
+    'postgresql': (
+        f'INSERT INTO {SEARCH_TABLE} (recipe_id, document) SELECT r.id, '
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', r.name), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', "
+        "coalesce(string_agg(i.name, ' '), '')), 'B') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', r.text), 'C') "
+        + DOCUMENT_SOURCE
+    ),
+    'sqlite': (
+        f'INSERT INTO {SEARCH_TABLE} (rowid, name, ingredients, text) '
+        "SELECT r.id, r.name, coalesce(group_concat(i.name, ' '), ''), "
+        'r.text ' + DOCUMENT_SOURCE
+    ),
+}
+DELETE_SQL = {
+    'postgresql': f'DELETE FROM {SEARCH_TABLE} WHERE recipe_id IN ({{}})',
+    'sqlite': f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({{}})',
+}
+# Поиск — соединение с таблицей документов: ранг, условие совпадения
+# и связь с рецептом. Соединение вместо подзапроса на каждую строку,
+# иначе FTS5 заново читает индекс для каждого рецепта.
+SEARCH_SQL = {
+    'postgresql': (
+        f"ts_rank({SEARCH_TABLE}.document, to_tsquery('{SEARCH_CONFIG}', %s))",
+        f"{SEARCH_TABLE}.document @@ to_tsquery('{SEARCH_CONFIG}', %s)",
+        f'{SEARCH_TABLE}.recipe_id = {Recipe._meta.db_table}.id',
+    ),
+    'sqlite': (
+        f'-bm25({SEARCH_TABLE}, 10.0, 5.0, 1.0)',
+        f'{SEARCH_TABLE} MATCH %s',
+        f'{SEARCH_TABLE}.rowid = {Recipe._meta.db_table}.id',
+    ),
+}
+
+_pending = threading.local()
+
+
+def search_words(query):
+    return re.findall(r'\w+', query.lower())[:MAX_QUERY_WORDS]
+
+
+def _match_query(words):
+    """Все слова запроса обязательны, каждое — как префикс."""
+    if connection.vendor == 'postgresql':
+        return ' & '.join(f'{word}:*' for word in words)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие под запрос, по убыванию релевантности.
+
+    Для баз без полнотекстового индекса — поиск по вхождению подстроки
+    без ранжирования.
+    """
+    words = search_words(query)
+    if not words:
+        return queryset
+    if connection.vendor not in SEARCH_SQL:
+        condition = Q()
+        for word in words:
+            condition &= (
+                Q(name__icontains=word)
+                | Q(text__icontains=word)
+                | Q(pk__in=IngredientRecipe.objects.filter(
+                    ingredient__name__icontains=word
+                ).values('recipe_id'))
+            )
+        return queryset.filter(condition).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+    rank, match, join = SEARCH_SQL[connection.vendor]
+    query = _match_query(words)
+    return queryset.extra(
+        select={'search_rank': rank},
+        select_params=(query,) * rank.count('%s'),
+        tables=(SEARCH_TABLE,),
+        where=(match, join),
+        params=(query,),
+    ).order_by('-search_rank', '-pub_date', '-id')
+
+
+def update_search_documents(recipe_ids=None):
+    """Пересобирает документы рецептов; без recipe_ids — все сразу."""
+    if connection.vendor not in INSERT_SQL:
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        if recipe_ids is None:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            cursor.execute(INSERT_SQL[connection.vendor].format(where=''))
+            return
+        recipe_ids = sorted(recipe_ids)
+        for start in range(0, len(recipe_ids), UPDATE_CHUNK_SIZE):
+            chunk = recipe_ids[start:start + UPDATE_CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                DELETE_SQL[connection.vendor].format(placeholders), chunk
+            )
+            cursor.execute(
+                INSERT_SQL[connection.vendor].format(
+                    where=f'WHERE r.id IN ({placeholders})'
+                ),
+                chunk,
+            )
+
+
+def _flush():
+    recipe_ids = getattr(_pending, 'recipe_ids', None)
+    if recipe_ids:
+        _pending.recipe_ids = set()
+        update_search_documents(recipe_ids)
+
+
+def schedule_search_update(*recipe_ids):
+    """Обновление документов после коммита, одно на транзакцию.
+
+    Рецепт и его ингредиенты пишутся несколькими запросами, поэтому
+    документ собирается один раз, когда все они сохранены.
+    """
+    if not hasattr(_pending, 'recipe_ids'):
+        _pending.recipe_ids = set()
+    _pending.recipe_ids.update(recipe_ids)
+    transaction.on_commit(_flush)
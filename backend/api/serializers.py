@@ -1,3 +1,4 @@
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from djoser.serializers import UserSerializer, UserCreateSerializer
 from rest_framework import serializers, status
@@ -7,12 +8,20 @@ from rest_framework.fields import SerializerMethodField
 
 from administration.models import Ingredient, Tag
 from api.fields import Base64ImageField
+from api.images import delete_variants, schedule_variants, variant_urls
+from api.relations import get_relations
+from api.shopping_list import change_recipe_amounts
+from api.similarity import schedule_similar_update
+from api.timing import TimedSerializerMixin
 from cook.models import IngredientRecipe, Recipe
 from print.models import Favorite, ShoppingCart
 from users.models import User
 
+# Сколько рецептов можно добавить или удалить одним запросом.
+MAX_BATCH_RECIPES = 100
 
-class UserSerializer(UserSerializer):
+
+class UserSerializer(TimedSerializerMixin, UserSerializer):
     is_subscribed = SerializerMethodField(read_only=True)
 
     class Meta:
@@ -27,13 +36,12 @@ class UserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if self.context.get('request').user.is_anonymous:
-            return False
-        return obj.following.filter(user=request.user).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.pk in get_relations(self.context.get('request')).follows
 
 
-class UserCreateSerializer(UserCreateSerializer):
+class UserCreateSerializer(TimedSerializerMixin, UserCreateSerializer):
 
     class Meta:
         model = User
@@ -82,19 +90,30 @@ class SubscribeListSerializer(UserSerializer):
         return data
 
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[: int(limit)]
+        if hasattr(obj, 'recipe_previews'):
+            recipes = obj.recipe_previews
+        else:
+            request = self.context.get('request')
+            limit = request.GET.get('recipes_limit')
+            recipes = obj.recipes.all()
+            if limit:
+                recipes = recipes[: int(limit)]
         serializer = RecipeShortSerializer(recipes, many=True, read_only=True)
         return serializer.data
 
 
-class RecipeMiniSerializer(serializers.ModelSerializer):
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BATCH_RECIPES,
+    )
+
+
+class RecipeMiniSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
@@ -106,7 +125,7 @@ class RecipeMiniSerializer(serializers.ModelSerializer):
         )
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     id = serializers.ReadOnlyField()
     name = serializers.ReadOnlyField()
     measurement_unit = serializers.ReadOnlyField()
@@ -120,7 +139,8 @@ class IngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class IngredientRecipeSerializer(serializers.ModelSerializer):
+class IngredientRecipeSerializer(TimedSerializerMixin,
+                                 serializers.ModelSerializer):
     id = serializers.IntegerField(source='ingredient.id')
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
@@ -137,7 +157,7 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         )
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = (
@@ -148,7 +168,7 @@ class TagSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     tags = TagSerializer(many=True)
     ingredients = IngredientRecipeSerializer(
         many=True, source='ingredientrecipes'
@@ -156,6 +176,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True, many=False)
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
+    image_variants = SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -163,24 +184,24 @@ class RecipeSerializer(serializers.ModelSerializer):
             'id',
             'tags',
             'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'image_variants',
+            'text', 'cooking_time'
         )
         read_only_fields = ('author',)
 
+    def get_image_variants(self, obj):
+        return variant_urls(
+            obj.image.name, obj.variants_image, self.context.get('request')
+        )
+
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return user.favorites.filter(recipe=obj).exists()
+        return obj.pk in get_relations(self.context.get('request')).favorites
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        return obj.shopping_list.filter(user=request.user).exists()
+        return obj.pk in get_relations(self.context.get('request')).cart
 
 
-class RecipePostSerializer(serializers.ModelSerializer):
+class RecipePostSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     tags = serializers.SlugRelatedField(
         slug_field="id",
         queryset=Tag.objects.all(),
@@ -216,6 +237,13 @@ class RecipePostSerializer(serializers.ModelSerializer):
                     'Указано несколько одинаковых ингредиентов'
                 )
             ingredients_id_list.append(ingredient_id)
+        found = Ingredient.objects.in_bulk(ingredients_id_list)
+        missing = set(ingredients_id_list) - found.keys()
+        if missing:
+            raise serializers.ValidationError(
+                'Ингредиенты не найдены: '
+                + ', '.join(map(str, sorted(missing)))
+            )
         return value
 
     def validate_tags(self, value):
@@ -225,51 +253,113 @@ class RecipePostSerializer(serializers.ModelSerializer):
             )
         return value
 
+    @staticmethod
+    def _get_amounts(ingredients):
+        return {
+            ingredient['ingredient']['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+
     def _create_ingredient_recipe_objects(self, ingredients, recipe):
-        for ingredient in ingredients:
-            ingredient_amount = ingredient.pop("amount")
-            ingredient_obj = get_object_or_404(
-                Ingredient, id=ingredient['ingredient']['id']
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
             )
-            IngredientRecipe.objects.get_or_create(
-                recipe=recipe,
-                ingredient=ingredient_obj,
-                amount=ingredient_amount
+            for ingredient_id, amount in self._get_amounts(ingredients).items()
+        )
+        return recipe
+
+    def _update_ingredient_recipe_objects(self, ingredients, recipe):
+        """Изменяет только добавленные, удалённые и изменённые строки;
+        разница количеств переносится в списки покупок."""
+        amounts = self._get_amounts(ingredients)
+        current = {
+            ingredient_recipe.ingredient_id: ingredient_recipe
+            for ingredient_recipe in recipe.ingredientrecipes.all()
+        }
+        deltas = {
+            ingredient_id: amount for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        }
+        removed = current.keys() - amounts.keys()
+        if removed:
+            recipe.ingredientrecipes.filter(
+                ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, ingredient_recipe in current.items():
+            amount = amounts.get(ingredient_id, 0)
+            deltas[ingredient_id] = amount - ingredient_recipe.amount
+            if ingredient_id not in removed and (
+                ingredient_recipe.amount != amount
+            ):
+                ingredient_recipe.amount = amount
+                changed.append(ingredient_recipe)
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ('amount',))
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
             )
-            recipe.ingredients.add(ingredient_obj)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        )
+        change_recipe_amounts(recipe.pk, deltas)
+        if amounts.keys() != current.keys():
+            schedule_similar_update(recipe.pk)
         return recipe
 
+    @staticmethod
+    def _schedule_image_variants(recipe, old_image=None):
+        name = recipe.image.name
+        transaction.on_commit(lambda: schedule_variants(name))
+        if old_image and old_image != name:
+            transaction.on_commit(lambda: delete_variants(old_image))
+
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop("tags")
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
+        self._schedule_image_variants(recipe)
         return self._create_ingredient_recipe_objects(ingredients, recipe)
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        old_image = instance.image.name
         instance = super().update(instance, validated_data)
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self._create_ingredient_recipe_objects(ingredients, recipe=instance)
+        if 'image' in validated_data:
+            self._schedule_image_variants(instance, old_image)
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            self._update_ingredient_recipe_objects(ingredients, instance)
         return instance
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        instance = Recipe.objects.for_serialization().get(pk=instance.pk)
         return RecipeSerializer(instance, context=context).data
 
 
-class RecipeShortSerializer(serializers.ModelSerializer):
+class RecipeShortSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    image_variants = SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+    def get_image_variants(self, obj):
+        return variant_urls(
+            obj.image.name, obj.variants_image, self.context.get('request')
+        )
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Favorite
@@ -290,7 +380,8 @@ class FavoriteSerializer(serializers.ModelSerializer):
         ).data
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
+class ShoppingCartSerializer(TimedSerializerMixin,
+                             serializers.ModelSerializer):
 
     class Meta:
         model = ShoppingCart
@@ -0,0 +1,95 @@
+from django.db import connection
+
+from cook.models import IngredientRecipe
+from print.models import ShoppingCart, ShoppingListItem
+
+LIST_TABLE = ShoppingListItem._meta.db_table
+# Прибавляет к строкам списка количества из выборки (user_id,
+# ingredient_id, amount); новые строки создаются. ON CONFLICT понимают
+# и PostgreSQL, и SQLite. Условие WHERE в выборке обязательно для SQLite.
+UPSERT_SQL = (
+    f'INSERT INTO {LIST_TABLE} (user_id, ingredient_id, amount) {{select}} '
+    'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+    f'SET amount = {LIST_TABLE}.amount + excluded.amount'
+)
+RECIPES_SELECT = (
+    'SELECT %s, ir.ingredient_id, SUM(ir.amount) * %s '
+    f'FROM {IngredientRecipe._meta.db_table} ir '
+    'WHERE ir.recipe_id IN ({placeholders}) GROUP BY ir.ingredient_id'
+)
+CARTS_SELECT = (
+    'SELECT c.user_id, d.column1, d.column2 '
+    f'FROM {ShoppingCart._meta.db_table} c '
+    'CROSS JOIN (VALUES {values}) d WHERE c.recipe_id = %s'
+)
+REBUILD_SELECT = (
+    'SELECT c.user_id, ir.ingredient_id, SUM(ir.amount) '
+    f'FROM {ShoppingCart._meta.db_table} c '
+    f'JOIN {IngredientRecipe._meta.db_table} ir '
+    'ON ir.recipe_id = c.recipe_id {where} '
+    'GROUP BY c.user_id, ir.ingredient_id'
+)
+
+
+def _placeholders(count):
+    return ', '.join(['%s'] * count)
+
+
+def _remove_empty(**filters):
+    ShoppingListItem.objects.filter(amount__lte=0, **filters).delete()
+
+
+def change_cart(user_id, recipe_ids, sign):
+    """Прибавляет (sign=1) или вычитает (sign=-1) ингредиенты рецептов
+    из списка покупок пользователя."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPSERT_SQL.format(select=RECIPES_SELECT.format(
+                placeholders=_placeholders(len(recipe_ids))
+            )),
+            [user_id, sign, *recipe_ids],
+        )
+    if sign < 0:
+        _remove_empty(user_id=user_id)
+
+
+def change_recipe_amounts(recipe_id, deltas):
+    """Изменения количеств ингредиентов рецепта {ingredient_id: delta}
+    во всех списках, где этот рецепт в корзине."""
+    deltas = [(pk, delta) for pk, delta in deltas.items() if delta]
+    if not deltas:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPSERT_SQL.format(select=CARTS_SELECT.format(
+                values=', '.join(['(%s, %s)'] * len(deltas))
+            )),
+            [value for delta in deltas for value in delta] + [recipe_id],
+        )
+    if any(delta < 0 for _, delta in deltas):
+        _remove_empty(
+            ingredient_id__in=[pk for pk, delta in deltas if delta < 0]
+        )
+
+
+def rebuild_shopping_lists(user_ids=None):
+    """Пересобирает списки пользователей из корзин; без user_ids — все."""
+    items = ShoppingListItem.objects.all()
+    where, params = '', []
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        items = items.filter(user_id__in=user_ids)
+        where = f'WHERE c.user_id IN ({_placeholders(len(user_ids))})'
+        params = user_ids
+    items.delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {LIST_TABLE} (user_id, ingredient_id, amount) '
+            + REBUILD_SELECT.format(where=where),
+            params,
+        )
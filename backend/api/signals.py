@@ -0,0 +1,161 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from administration.models import Ingredient, Tag
+from api.authentication import token_cache
+from api.caching import bump_version
+from api.counters import change_counters
+from api.feed import (fan_out, fan_out_resumed, follow_author,
+                      schedule_backfill, unfollow_author)
+from api.images import delete_variants
+from api.ingredient_index import ingredient_index
+from api.relations import invalidate_relations
+from api.search import schedule_search_update
+from api.shopping_list import change_cart
+from api.similarity import outdate_similar_lists, schedule_similar_update
+from cook.models import IngredientRecipe, Recipe
+from print.models import Favorite, ShoppingCart
+from users.models import Follow, User, auth_fields_updated
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_search(sender, instance, created, **kwargs):
+    if not created:
+        schedule_search_update(*IngredientRecipe.objects.filter(
+            ingredient=instance
+        ).values_list('recipe_id', flat=True))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def update_recipe_search(sender, instance, **kwargs):
+    schedule_search_update(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def update_ingredient_recipe_search(sender, instance, **kwargs):
+    schedule_search_update(instance.recipe_id)
+
+
+# Количество ингредиента на сходство рецептов не влияет.
+@receiver(post_save, sender=IngredientRecipe)
+def add_ingredient_similar_update(sender, instance, created, **kwargs):
+    if created:
+        schedule_similar_update(instance.recipe_id)
+
+
+@receiver(post_delete, sender=IngredientRecipe)
+def remove_ingredient_similar_update(sender, instance, **kwargs):
+    schedule_similar_update(instance.recipe_id)
+
+
+# Как при замене изображения: после коммита и только если изображение
+# больше ни у какого рецепта не используется.
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_image_variants(sender, instance, **kwargs):
+    name = instance.image.name
+    transaction.on_commit(lambda: delete_variants(name))
+
+
+@receiver(pre_delete, sender=Recipe)
+def outdate_similar_recipes(sender, instance, **kwargs):
+    outdate_similar_lists(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    bump_version(Tag)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Follow)
+def invalidate_user_relations(sender, instance, **kwargs):
+    invalidate_relations(instance.user_id)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Follow)
+def increment_counters(sender, instance, created, **kwargs):
+    if created:
+        change_counters(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Follow)
+def decrement_counters(sender, instance, **kwargs):
+    change_counters(sender, instance, -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        change_cart(instance.user_id, [instance.recipe_id], 1)
+
+
+# До удаления: при удалении рецепта его ингредиенты ещё на месте.
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    change_cart(instance.user_id, [instance.recipe_id], -1)
+
+
+# После коммита: раскладка по лентам не держит транзакцию создания.
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: fan_out(
+            instance.author_id, [(instance.pk, instance.pub_date)]
+        ))
+
+
+@receiver(post_save, sender=Follow)
+def add_author_to_feed(sender, instance, created, **kwargs):
+    if created:
+        follow_author(instance.user_id, instance.author_id)
+
+
+# Счётчик подписчиков к этому моменту уже уменьшен decrement_counters.
+# При переходе порога вверх записи ленты не удаляются: повторы с
+# рецептами, читаемыми при чтении, пагинация ленты отбрасывает.
+@receiver(post_delete, sender=Follow)
+def remove_author_from_feed(sender, instance, **kwargs):
+    unfollow_author(instance.user_id, instance.author_id)
+    followers = User.objects.filter(pk=instance.author_id).values_list(
+        'followers_count', flat=True
+    ).first()
+    if followers is not None and fan_out_resumed(followers + 1, followers):
+        schedule_backfill([instance.author_id])
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+def _invalidate_tokens(user_ids):
+    token_cache.invalidate(*Token.objects.filter(
+        user__in=user_ids
+    ).values_list('key', flat=True))
+
+
+# Активность и данные профиля берутся из кэша токенов, смена пароля
+# должна сбрасывать токены; вход меняет только last_login.
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, update_fields, **kwargs):
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        _invalidate_tokens([instance.pk])
+
+
+@receiver(auth_fields_updated, sender=User)
+def invalidate_updated_user_tokens(sender, user_ids, **kwargs):
+    _invalidate_tokens(user_ids)
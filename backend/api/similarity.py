@@ -0,0 +1,252 @@
+import threading
+from array import array
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from scipy import sparse
+
+from cook.models import IngredientRecipe, Recipe, SimilarRecipe
+
+METRICS = ('cosine', 'jaccard')
+SIMILAR_TOP_K = 10
+# Ненулевых пересечений рецептов в одной пачке умножения матриц: память
+# на пачку — около сотни байт на пересечение.
+SIMILAR_MAX_PAIRS = 2000000
+# Рецептов в пачке: столько же id уходит в IN при записи.
+SIMILAR_CHUNK_SIZE = 500
+FETCH_CHUNK_SIZE = 10000
+INSERT_BATCH_SIZE = 1000
+
+_pending = threading.local()
+
+
+def _batches(ids, size=SIMILAR_CHUNK_SIZE):
+    ids = sorted(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def _pending_ids(name):
+    if not hasattr(_pending, name):
+        setattr(_pending, name, set())
+    return getattr(_pending, name)
+
+
+def _flush():
+    recipe_ids = _pending_ids('recipe_ids') - _pending_ids('deleted_ids')
+    _pending.recipe_ids, _pending.deleted_ids = set(), set()
+    for batch in _batches(recipe_ids):
+        Recipe.objects.filter(pk__in=batch).update(similar_outdated=True)
+
+
+def schedule_similar_update(*recipe_ids):
+    """Отмечает после коммита рецепты с изменённым набором ингредиентов,
+    одним запросом на транзакцию."""
+    _pending_ids('recipe_ids').update(recipe_ids)
+    transaction.on_commit(_flush)
+
+
+def outdate_similar_lists(recipe_id):
+    """Отмечает рецепты, в списках которых есть удаляемый рецепт; сам
+    рецепт после удаления отмечать не нужно."""
+    _pending_ids('deleted_ids').add(recipe_id)
+    Recipe.objects.filter(
+        similar_recipes__similar=recipe_id
+    ).update(similar_outdated=True)
+
+
+class IngredientMatrix:
+    """Разреженная матрица рецепт × ингредиент из нулей и единиц.
+
+    Строки — рецепты с ингредиентами по возрастанию id; сходство
+    считается произведением пачки строк на транспонированную матрицу,
+    в котором остаются только рецепты с общими ингредиентами.
+    """
+
+    def __init__(self):
+        recipes, ingredients = array('q'), array('q')
+        for recipe_id, ingredient_id in (
+            IngredientRecipe.objects.order_by()
+            .values_list('recipe_id', 'ingredient_id')
+            .iterator(chunk_size=FETCH_CHUNK_SIZE)
+        ):
+            recipes.append(recipe_id)
+            ingredients.append(ingredient_id)
+        self.ids, rows = np.unique(
+            np.asarray(recipes, dtype=np.int64), return_inverse=True
+        )
+        _, columns = np.unique(
+            np.asarray(ingredients, dtype=np.int64), return_inverse=True
+        )
+        width = int(columns.max(initial=-1)) + 1
+        self.matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+            shape=(len(self.ids), width),
+        )
+        self.transposed = self.matrix.T.tocsr()
+        self.sizes = np.diff(self.matrix.indptr).astype(np.float64)
+        # Число пересечений строки не больше суммы частот её ингредиентов.
+        self.costs = self.matrix @ np.bincount(columns, minlength=width)
+
+    def positions(self, recipe_ids):
+        """Номера строк рецептов и отметки, у каких рецептов строка есть."""
+        recipe_ids = np.asarray(recipe_ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.zeros(len(recipe_ids), dtype=np.int64), np.zeros(
+                len(recipe_ids), dtype=bool
+            )
+        positions = np.minimum(
+            np.searchsorted(self.ids, recipe_ids), len(self.ids) - 1
+        )
+        return positions, self.ids[positions] == recipe_ids
+
+    def rows(self, recipe_ids):
+        """Номера строк рецептов; рецепты без ингредиентов пропускаются."""
+        positions, found = self.positions(sorted(set(recipe_ids)))
+        return positions[found]
+
+    def chunks(self, rows, max_pairs=SIMILAR_MAX_PAIRS,
+               chunk_size=SIMILAR_CHUNK_SIZE):
+        """Пачки строк, в которых пересечений не больше max_pairs."""
+        totals = np.cumsum(self.costs[rows])
+        start = 0
+        while start < len(rows):
+            done = totals[start - 1] if start else 0
+            end = int(np.searchsorted(totals, done + max_pairs, 'right'))
+            end = min(max(end, start + 1), start + chunk_size)
+            yield rows[start:end]
+            start = end
+
+    def scores(self, rows, metric):
+        """Сходство строк rows со всеми рецептами, у которых есть общие
+        ингредиенты: разреженная матрица len(rows) × число рецептов."""
+        product = (self.matrix[rows] @ self.transposed).tocsr()
+        own = np.repeat(rows, np.diff(product.indptr))
+        other = product.indices
+        common = product.data.astype(np.float64)
+        if metric == 'cosine':
+            score = common / np.sqrt(self.sizes[own] * self.sizes[other])
+        else:
+            score = common / (self.sizes[own] + self.sizes[other] - common)
+        score[other == own] = 0
+        similarity = sparse.csr_matrix(
+            (score, other, product.indptr), shape=product.shape
+        )
+        similarity.eliminate_zeros()
+        return similarity
+
+    def top(self, rows, similarity, top_k):
+        """top_k самых похожих для каждой строки: np.partition отсекает
+        всё ниже top_k-го сходства, остаток сортируется по убыванию
+        сходства и возрастанию id. Возвращает (id рецепта, id похожего,
+        место, сходство)."""
+        recipes, similar, ranks, scores = [], [], [], []
+        for local, row in enumerate(rows):
+            start, end = similarity.indptr[local:local + 2]
+            score = similarity.data[start:end]
+            other = similarity.indices[start:end]
+            if len(score) > top_k:
+                keep = score >= np.partition(
+                    score, len(score) - top_k
+                )[len(score) - top_k]
+                score, other = score[keep], other[keep]
+            order = np.lexsort((other, -score))[:top_k]
+            recipes.append(np.full(len(order), row))
+            similar.append(other[order])
+            ranks.append(np.arange(len(order)))
+            scores.append(score[order])
+        return (
+            self.ids[np.concatenate(recipes)],
+            self.ids[np.concatenate(similar)],
+            np.concatenate(ranks),
+            np.concatenate(scores),
+        )
+
+
+def _store(recipe_ids, top):
+    """Заменяет списки похожих для recipe_ids одной транзакцией."""
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe__in=recipe_ids).delete()
+        SimilarRecipe.objects.bulk_create(
+            (SimilarRecipe(
+                recipe_id=recipe_id, similar_id=similar_id, rank=rank,
+                score=score,
+            ) for recipe_id, similar_id, rank, score in zip(
+                *(values.tolist() for values in top)
+            )),
+            batch_size=INSERT_BATCH_SIZE,
+        )
+    return len(top[0])
+
+
+def _compute(matrix, rows, top_k, metric, max_pairs, thresholds=None):
+    """Пересчитывает списки строк rows пачками. С thresholds возвращает
+    рецепты, в списки которых могут войти пересчитанные рецепты."""
+    stored, affected = 0, set()
+    for chunk in matrix.chunks(rows, max_pairs):
+        similarity = matrix.scores(chunk, metric)
+        stored += _store(
+            matrix.ids[chunk].tolist(), matrix.top(chunk, similarity, top_k)
+        )
+        if thresholds is not None:
+            other = similarity.indices
+            affected.update(matrix.ids[
+                other[similarity.data >= thresholds[other]]
+            ].tolist())
+    return stored, affected
+
+
+def _thresholds(matrix, top_k):
+    """Сходство последнего из top_k в текущих списках; 0 для неполных."""
+    recipe_ids, scores = array('q'), array('d')
+    for recipe_id, score in SimilarRecipe.objects.filter(
+        rank=top_k - 1
+    ).values_list('recipe_id', 'score').iterator(chunk_size=FETCH_CHUNK_SIZE):
+        recipe_ids.append(recipe_id)
+        scores.append(score)
+    thresholds = np.zeros(len(matrix.ids))
+    positions, found = matrix.positions(recipe_ids)
+    thresholds[positions[found]] = np.asarray(scores)[found]
+    return thresholds
+
+
+def build_similar_recipes(top_k=SIMILAR_TOP_K, metric='cosine',
+                          max_pairs=SIMILAR_MAX_PAIRS, changed_only=False):
+    """Пересчитывает top_k похожих по ингредиентам рецептов.
+
+    Без changed_only — для всех рецептов. С changed_only — для рецептов,
+    отмеченных similar_outdated, и для тех, в чьих списках они есть или
+    теперь должны оказаться. Отметки снимаются до чтения ингредиентов:
+    изменения во время расчёта попадут в следующий. Возвращает число
+    пересчитанных рецептов и записанных пар.
+    """
+    outdated = Recipe.objects.filter(similar_outdated=True)
+    if changed_only:
+        changed = set(outdated.values_list('id', flat=True))
+        for batch in _batches(changed):
+            Recipe.objects.filter(pk__in=batch).update(similar_outdated=False)
+    else:
+        outdated.update(similar_outdated=False)
+    matrix = IngredientMatrix()
+    if not changed_only:
+        rows = np.arange(len(matrix.ids))
+        stored, _ = _compute(matrix, rows, top_k, metric, max_pairs)
+        SimilarRecipe.objects.filter(~Exists(IngredientRecipe.objects.filter(
+            recipe=OuterRef('recipe')
+        ))).delete()
+        return len(rows), stored
+    rows = matrix.rows(changed)
+    for batch in _batches(changed - set(matrix.ids[rows].tolist())):
+        SimilarRecipe.objects.filter(recipe__in=batch).delete()
+    affected = set()
+    for batch in _batches(changed):
+        affected.update(SimilarRecipe.objects.filter(
+            similar__in=batch
+        ).values_list('recipe_id', flat=True))
+    stored, candidates = _compute(
+        matrix, rows, top_k, metric, max_pairs, _thresholds(matrix, top_k)
+    )
+    others = matrix.rows((affected | candidates) - changed)
+    stored += _compute(matrix, others, top_k, metric, max_pairs)[0]
+    return len(rows) + len(others), stored
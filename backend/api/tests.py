@@ -0,0 +1,297 @@
+import json
+from io import StringIO
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from administration.models import Ingredient, Tag
+from api.benchmarks import seed_dataset
+from api.feed import backfill_outdated_feeds, rebuild_feeds
+from api.renderers import FastJSONRenderer
+from api.representations import recipe_representations, recipe_rows
+from api.serializers import RecipeSerializer
+from api.shopping_list import rebuild_shopping_lists
+from cook.models import IngredientRecipe, Recipe
+from print.models import FeedItem, ShoppingCart, ShoppingListItem
+from users.models import Follow, User
+
+# Строки, которые JSON-кодировщики экранируют по-разному.
+TRICKY_TEXT = 'Кавычки " \\ / </script>\n\t\x01\x1f\x7f \u2028\u2029 🍲'
+
+
+class RecipeRepresentationTests(TestCase):
+    """Чтение рецептов без RecipeSerializer отдаёт те же байты, что
+    RecipeSerializer с JSONRenderer DRF."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(
+            users=20, recipes=60, favorites=200, carts=40, follows=40
+        )
+        author = cls.user.follower.first().author
+        author.first_name = TRICKY_TEXT[:60]
+        author.save()
+        tricky = Recipe.objects.create(
+            author=author, name=TRICKY_TEXT, title='tricky',
+            text=TRICKY_TEXT * 3, cooking_time=1,
+            image='recipe_images/temp.png',
+        )
+        tricky.tags.set(Tag.objects.all())
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=tricky, ingredient=ingredient, amount=1)
+            for ingredient in Ingredient.objects.order_by('-id')[:5]
+        )
+        cls.recipe_ids = list(
+            Recipe.objects.order_by('-id').values_list('id', flat=True)
+        )
+
+    def request(self, user):
+        request = APIRequestFactory().get('/api/recipes/')
+        request.user = user or AnonymousUser()
+        return request
+
+    def serializer_data(self, recipe_ids, user):
+        recipes = Recipe.objects.for_serialization().in_bulk(recipe_ids)
+        return RecipeSerializer(
+            [recipes[pk] for pk in recipe_ids], many=True,
+            context={'request': self.request(user)},
+        ).data
+
+    def client_for(self, user):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+
+    def assert_representations(self, user):
+        expected = JSONRenderer().render(
+            self.serializer_data(self.recipe_ids, user)
+        )
+        rows = recipe_rows(
+            Recipe.objects.filter(pk__in=self.recipe_ids).order_by('-id')
+        )
+        actual = FastJSONRenderer().render(
+            recipe_representations(list(rows), self.request(user))
+        )
+        self.assertEqual(actual, expected)
+
+    def assert_list(self, user):
+        response = self.client_for(user).get('/api/recipes/?limit=100')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(
+            [item['id'] for item in data['results']], self.recipe_ids
+        )
+        data['results'] = self.serializer_data(self.recipe_ids, user)
+        self.assertEqual(response.content, JSONRenderer().render(data))
+
+    def assert_detail(self, user):
+        client = self.client_for(user)
+        for pk in self.recipe_ids:
+            with self.subTest(recipe=pk):
+                response = client.get(f'/api/recipes/{pk}/')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    response.content,
+                    JSONRenderer().render(self.serializer_data([pk], user)[0]),
+                )
+
+    def test_representations_anonymous(self):
+        self.assert_representations(None)
+
+    def test_representations_authenticated(self):
+        self.assert_representations(self.user)
+
+    def test_list_anonymous(self):
+        self.assert_list(None)
+
+    def test_list_authenticated(self):
+        self.assert_list(self.user)
+
+    def test_detail_anonymous(self):
+        self.assert_detail(None)
+
+    def test_detail_authenticated(self):
+        self.assert_detail(self.user)
+
+
+class ShoppingListTests(TestCase):
+    """Суммированные списки покупок, которые обновляются сигналами,
+    пакетными запросами и UPSERT, совпадают с пересобранными из корзин."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(
+            users=10, recipes=80, favorites=0, carts=40, follows=0
+        )
+        cls.recipe_ids = list(Recipe.objects.exclude(
+            shopping_list__user=cls.user
+        ).order_by('id').values_list('id', flat=True)[:4])
+        cls.other = ShoppingCart.objects.exclude(
+            user=cls.user
+        ).select_related('user').first().user
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_lists_rebuilt(self):
+        def items():
+            return set(ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            ))
+
+        actual = items()
+        self.assertTrue(actual)
+        rebuild_shopping_lists()
+        self.assertEqual(actual, items())
+
+    def test_cart_changes(self):
+        recipe_id = self.recipe_ids[0]
+        response = self.client.post(
+            '/api/recipes/shopping_cart/',
+            {'recipes': self.recipe_ids}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        other = APIClient()
+        other.force_authenticate(self.other)
+        other.post(f'/api/recipes/{recipe_id}/shopping_cart/')
+        self.assert_lists_rebuilt()
+
+        recipe = Recipe.objects.get(pk=recipe_id)
+        amounts = dict(recipe.ingredientrecipes.values_list(
+            'ingredient_id', 'amount'
+        ))
+        kept = sorted(amounts)[1:]
+        added = Ingredient.objects.exclude(
+            pk__in=amounts
+        ).values_list('pk', flat=True).first()
+        author = APIClient()
+        author.force_authenticate(recipe.author)
+        response = author.patch(f'/api/recipes/{recipe_id}/', {
+            'ingredients': [
+                {'id': pk, 'amount': amounts[pk] + 5} for pk in kept
+            ] + [{'id': added, 'amount': 7}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assert_lists_rebuilt()
+
+        response = self.client.delete(
+            '/api/recipes/shopping_cart/',
+            {'recipes': self.recipe_ids[1:3]}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_lists_rebuilt()
+
+        response = author.delete(f'/api/recipes/{recipe_id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_lists_rebuilt()
+
+
+class FeedTests(TestCase):
+    """Ленты, которые дополняются при подписке, публикации и переходе
+    порога FEED_FANOUT_MAX_FOLLOWERS, совпадают с пересобранными."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=15, recipes=40, favorites=0, carts=0, follows=60)
+        cls.author = User.objects.filter(
+            recipes__isnull=False, followers_count__gte=2
+        ).order_by('-followers_count', 'id').first()
+        cls.reader = User.objects.exclude(pk=cls.author.pk).exclude(
+            follower__author=cls.author
+        ).order_by('id').first()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def followers(self):
+        return User.objects.get(pk=self.author.pk).followers_count
+
+    def feed_items(self, user):
+        return set(FeedItem.objects.filter(
+            user=user, recipe__author=self.author
+        ).values_list('recipe_id', flat=True))
+
+    def feed(self, user):
+        response = self.client_for(user).get('/api/recipes/feed/?limit=100')
+        self.assertEqual(response.status_code, 200)
+        return {item['id'] for item in response.data['results']}
+
+    def publish(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Recipe.objects.create(
+                author=self.author, name='Новый', title='Новый',
+                text='Описание', cooking_time=5,
+                image='recipe_images/temp.png',
+            ).pk
+
+    def assert_feeds_rebuilt(self):
+        def items():
+            return set(FeedItem.objects.values_list('user_id', 'recipe_id'))
+
+        actual = items()
+        self.assertTrue(actual)
+        rebuild_feeds()
+        self.assertEqual(actual, items())
+
+    def test_follow_publish_unfollow(self):
+        client = self.client_for(self.reader)
+        url = f'/api/users/{self.author.pk}/subscribe/'
+        self.assertEqual(client.post(url).status_code, 201)
+        self.assertEqual(
+            self.feed_items(self.reader),
+            set(self.author.recipes.values_list('id', flat=True)),
+        )
+        self.assert_feeds_rebuilt()
+        recipe_id = self.publish()
+        self.assertIn(recipe_id, self.feed_items(self.reader))
+        self.assert_feeds_rebuilt()
+        self.assertEqual(client.delete(url).status_code, 204)
+        self.assertEqual(self.feed_items(self.reader), set())
+        self.assert_feeds_rebuilt()
+
+    def test_unfollow_to_limit_backfills(self):
+        follow = Follow.objects.filter(author=self.author).first()
+        reader = follow.user
+        with override_settings(
+            FEED_FANOUT_MAX_FOLLOWERS=self.followers() - 1
+        ):
+            recipe_id = self.publish()
+            self.assertNotIn(recipe_id, self.feed_items(reader))
+            self.assertIn(recipe_id, self.feed(reader))
+            other = Follow.objects.filter(
+                author=self.author
+            ).exclude(pk=follow.pk).first().user
+            self.assertEqual(self.client_for(other).delete(
+                f'/api/users/{self.author.pk}/subscribe/'
+            ).status_code, 204)
+            self.assertTrue(
+                User.objects.get(pk=self.author.pk).feed_outdated
+            )
+            self.assertEqual(backfill_outdated_feeds(), 1)
+            self.assertIn(recipe_id, self.feed_items(reader))
+            self.assertIn(recipe_id, self.feed(reader))
+            self.assert_feeds_rebuilt()
+
+    def test_reconcile_to_limit_backfills(self):
+        reader = Follow.objects.filter(author=self.author).first().user
+        followers = self.followers()
+        User.objects.filter(pk=self.author.pk).update(
+            followers_count=followers + 10
+        )
+        with override_settings(FEED_FANOUT_MAX_FOLLOWERS=followers):
+            recipe_id = self.publish()
+            self.assertNotIn(recipe_id, self.feed_items(reader))
+            call_command('reconcile_counters', stdout=StringIO())
+            self.assertEqual(self.followers(), followers)
+            self.assertIn(recipe_id, self.feed_items(reader))
+            self.assertFalse(
+                User.objects.get(pk=self.author.pk).feed_outdated
+            )
+            self.assert_feeds_rebuilt()
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_timings', default=None)
+# Сколько повторов показывать в журнале.
+MAX_REPORTED_DUPLICATES = 5
+# Место в коде ищется по стеку только у запросов, попадающих в журнал,
+# и не больше чем для стольких SQL-запросов.
+MAX_TRACED_QUERIES = 200
+
+
+class RequestTimings:
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.traced = 0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.serialize_time = 0.0
+        self.serialized = False
+        self.serializing = False
+        self.queries = Counter()
+
+    def duplicates(self):
+        """Одинаковые запросы из одного места кода, самые частые первыми;
+        без трассировки место не известно и запросы сравниваются по SQL."""
+        return [
+            (origin, sql, count)
+            for (origin, sql), count in self.queries.most_common()
+            if count > 1
+        ][:MAX_REPORTED_DUPLICATES]
+
+    def origin(self):
+        if not self.trace or self.traced >= MAX_TRACED_QUERIES:
+            return None
+        self.traced += 1
+        return _origin()
+
+
+def _origin():
+    """Место в сериализаторе, из которого пришёл запрос: метод
+    (RecipeSerializer.get_is_favorited) или поле (RecipeSerializer.tags).
+    Вне сериализаторов — первая функция проекта в стеке."""
+    fallback = None
+    frame = sys._getframe(3)
+    while frame is not None:
+        instance = frame.f_locals.get('self')
+        method = frame.f_code.co_name
+        if isinstance(instance, ListSerializer):
+            instance = instance.child
+        if isinstance(instance, BaseSerializer):
+            name = type(instance).__name__
+            if method != 'to_representation':
+                return f'{name}.{method}'
+            # Serializer.to_representation перебирает поля в переменной
+            # field: по ней видно, какое поле читало данные.
+            field = frame.f_locals.get('field')
+            if field is not None:
+                return f'{name}.{field.field_name}'
+        elif (fallback is None
+              and frame.f_globals.get('__name__') != __name__
+              and frame.f_code.co_filename.startswith(str(settings.BASE_DIR))):
+            fallback = f'{frame.f_globals.get("__name__")}.{method}'
+        frame = frame.f_back
+    return fallback or 'unknown'
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.sql_time += time.perf_counter() - start
+        timings.sql_count += 1
+        timings.queries[(timings.origin(), sql)] += 1
+
+
+def _install_wrapper(connection, **kwargs):
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+def _instrument():
+    # Соединения создаются в каждом потоке отдельно, поэтому обёртка
+    # ставится и на уже созданные, и на каждое новое.
+    connection_created.connect(_install_wrapper, weak=False)
+    for connection in connections.all():
+        _install_wrapper(connection)
+
+
+@contextmanager
+def timed_serialization():
+    """Отмечает построение ответа для метрики serialize; вложенные
+    отметки не суммируются повторно. Без SERVER_TIMING ничего не мерит."""
+    timings = _current.get()
+    if timings is None or timings.serializing:
+        yield
+        return
+    timings.serialized = timings.serializing = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.serialize_time += time.perf_counter() - start
+        timings.serializing = False
+
+
+class TimedSerializerMixin:
+    """Для сериализаторов ответов: to_representation попадает в метрику
+    serialize. Для many=True — по объекту, без выборки списка."""
+
+    def to_representation(self, instance):
+        with timed_serialization():
+            return super().to_representation(instance)
+
+
+def _milliseconds(seconds):
+    return round(seconds * 1000, 1)
+
+
+class ServerTimingMiddleware:
+    """Время запроса в заголовке Server-Timing и в журнале.
+
+    Считает запросы к базе и их время, время построения ответа (участки
+    timed_serialization и сериализаторы с TimedSerializerMixin, вместе с
+    запросами из них) и общее время; если ответ не строился, метрики
+    serialize нет.
+    Повторяющиеся запросы — признак N+1 — попадают в заголовок и журнал;
+    место в коде ищется только для запросов, попадающих в журнал.
+    Работает и под WSGI, и под ASGI без перехода в поток синхронного
+    кода. Включается настройкой SERVER_TIMING.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Как MiddlewareMixin в Django 3.2: так Django видит, что
+            # middleware асинхронный (markcoroutinefunction появился позже).
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        _instrument()
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        timings, logged = self.start()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            total = time.perf_counter() - start
+            _current.reset(token)
+        return self.finish(request, response, timings, total, logged)
+
+    async def __acall__(self, request):
+        timings, logged = self.start()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            total = time.perf_counter() - start
+            _current.reset(token)
+        return self.finish(request, response, timings, total, logged)
+
+    @staticmethod
+    def start():
+        logged = random.random() < settings.SERVER_TIMING_LOG_RATE
+        return RequestTimings(trace=logged), logged
+
+    def finish(self, request, response, timings, total, logged):
+        duplicates = timings.duplicates()
+        metrics = [
+            f'sql;dur={_milliseconds(timings.sql_time)};'
+            f'desc="{timings.sql_count} queries"',
+        ]
+        if timings.serialized:
+            metrics.append(
+                f'serialize;dur={_milliseconds(timings.serialize_time)}'
+            )
+        metrics.append(f'total;dur={_milliseconds(total)}')
+        if duplicates:
+            origin, _, count = duplicates[0]
+            metrics.append(
+                f'duplicates;desc="{origin or "same SQL"} x{count}"'
+            )
+        response['Server-Timing'] = ', '.join(metrics)
+        if logged:
+            self.log(request, response, timings, total, duplicates)
+        return response
+
+    @staticmethod
+    def log(request, response, timings, total, duplicates):
+        logger.log(
+            logging.WARNING if duplicates else logging.INFO,
+            json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': _milliseconds(total),
+                'sql_count': timings.sql_count,
+                'sql_ms': _milliseconds(timings.sql_time),
+                'serialize_ms': _milliseconds(timings.serialize_time)
+                if timings.serialized else None,
+                'duplicates': [
+                    {'origin': origin, 'count': count, 'sql': sql}
+                    for origin, sql, count in duplicates
+                ],
+            }, ensure_ascii=False),
+        )
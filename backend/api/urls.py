@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from .async_views import async_read_urls
 from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
 
 app_name = 'api'
@@ -11,9 +13,18 @@ router.register('tags', TagViewSet, basename='tags')
 router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('users', UserViewSet, basename='users')
 
+# Частые запросы на чтение выполняются параллельно в пуле потоков.
+ASYNC_READ_ROUTES = (
+    'ingredients-list', 'ingredients-detail', 'tags-list', 'tags-detail',
+    'recipes-list', 'recipes-detail', 'users-subscriptions',
+)
+
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', include(
+        async_read_urls(router.urls, ASYNC_READ_ROUTES)
+        if settings.ASYNC_READ_VIEWS else router.urls
+    )),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,37 +1,115 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import BooleanField, OuterRef, Prefetch, Subquery, Value
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from rest_framework import mixins, status, viewsets
+from rest_framework import generics, mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 
 from users.models import Follow, User
-from cook.models import IngredientRecipe, Recipe
+from cook.models import Recipe
 from administration.models import Ingredient, Tag
-from api.pagination import CustomPagination
+from api.caching import cached_reference
+from api.counters import bulk_change_counters
+from api.exports import SHOPPING_LIST_FORMATS
+from api.feed import FEED_ORDERING, feed_querysets
+from api.ingredient_index import ingredient_index
+from api.pagination import MergedKeysetPagination, OptionalKeysetPagination
 from api.permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
+from api.recipe_lists import add_recipes, remove_recipes
+from api.relations import invalidate_relations
+from api.renderers import FastJSONRenderer
+from api.replicas import ReplicaReadMixin
+from api.representations import recipe_representations, recipe_rows
 from api.serializers import (FavoriteSerializer, IngredientSerializer,
-                             RecipePostSerializer, RecipeSerializer,
-                             ShoppingCartSerializer, TagSerializer,
-                             SubscribeListSerializer, UserSerializer)
-from print.models import Favorite, ShoppingCart
+                             RecipeIdsSerializer, RecipePostSerializer,
+                             RecipeSerializer, RecipeShortSerializer,
+                             ShoppingCartSerializer,
+                             TagSerializer, SubscribeListSerializer,
+                             UserSerializer)
+from api.shopping_list import change_cart
+from print.models import Favorite, ShoppingCart, ShoppingListItem
 
-from .pagination import CustomPagination
-from .filters import RecipeFilter, IngredientSearchFilter
+from .filters import IngredientSearchFilter, RecipeFilter, RecipeSearchFilter
 
+SHOPPING_LIST_CHUNK_SIZE = 500
+# Итог для каждого рецепта пакетного запроса: (изменён, уже был, не найден).
+BATCH_STATUSES = {
+    'POST': ('added', 'already_added', 'not_found'),
+    'DELETE': ('removed', 'not_added', 'not_found'),
+}
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
-    pagination_class = CustomPagination
+    pagination_class = OptionalKeysetPagination
+    keyset_ordering = ('-pub_date', '-id')
     permission_classes = (IsAuthorOrReadOnly,)
-    filter_backends = (DjangoFilterBackend, OrderingFilter,)
+    filter_backends = (DjangoFilterBackend, OrderingFilter, RecipeSearchFilter)
     filterset_class = RecipeFilter
     ordering = ('-id',)
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+
+    def get_queryset(self):
+        return Recipe.objects.for_serialization()
+
+    def list(self, request, *args, **kwargs):
+        """Чтение без RecipeSerializer: словари из строк values()."""
+        rows = recipe_rows(self.filter_queryset(Recipe.objects.all()))
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(recipe_representations(list(rows), request))
+        return self.get_paginated_response(
+            recipe_representations(page, request)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        row = generics.get_object_or_404(
+            recipe_rows(self.filter_queryset(Recipe.objects.all())),
+            pk=kwargs[self.lookup_field],
+        )
+        self.check_object_permissions(request, row)
+        return Response(recipe_representations([row], request)[0])
+
+    @action(
+        detail=False,
+        methods=('GET',),
+        permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Рецепты авторов из подписок, новые первыми, по курсору."""
+        paginator = MergedKeysetPagination(FEED_ORDERING)
+        page = paginator.paginate_queryset(
+            feed_querysets(request.user), request, self
+        )
+        rows = {
+            row['id']: row for row in recipe_rows(Recipe.objects.filter(
+                pk__in=[item['recipe_id'] for item in page]
+            ).order_by())
+        }
+        return paginator.get_paginated_response(recipe_representations(
+            [rows[item['recipe_id']] for item in page
+             if item['recipe_id'] in rows],
+            request,
+        ))
+
+    @action(detail=True, methods=('GET',))
+    def similar(self, request, pk):
+        """Похожие по ингредиентам рецепты, самые похожие первыми; списки
+        считает команда build_similar_recipes."""
+        recipe = generics.get_object_or_404(Recipe.objects.only('pk'), pk=pk)
+        recipes = Recipe.objects.filter(
+            similar_to__recipe=recipe
+        ).order_by('similar_to__rank')
+        return Response(RecipeShortSerializer(
+            recipes, many=True, context={'request': request}
+        ).data)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -42,26 +120,42 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return RecipeSerializer
 
     @staticmethod
-    def get_txt_file(ingredients):
-        shopping_list = 'Что купить в магазине:'
-        for ingredient in ingredients:
-            shopping_list += (
-                f"\n{ingredient['ingredient__name']} "
-                f"({ingredient['ingredient__measurement_unit']}) - "
-                f"{ingredient['amount']}")
-        file = 'shopping_list.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename="{file}.txt"'
+    def get_shopping_list_file(ingredients, file_format):
+        chunks, content_type, extension, _ = SHOPPING_LIST_FORMATS[
+            file_format
+        ]
+        response = StreamingHttpResponse(
+            chunks(ingredients), content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{extension}"'
+        )
         return response
 
-    @action(detail=False, methods=['GET'])
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
-        ingredients = IngredientRecipe.objects.filter(
-            recipe__shopping_list__user=request.user
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'file_format': 'Допустимые форматы: '
+                 + ', '.join(SHOPPING_LIST_FORMATS)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        ready = SHOPPING_LIST_FORMATS[file_format][3]
+        if ready is not None and not ready():
+            return Response(
+                {'file_format': f'Формат {file_format} сейчас недоступен'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
         ).order_by('ingredient__name').values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        return self.get_txt_file(ingredients)
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        ).iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+        return self.get_shopping_list_file(ingredients, file_format)
 
     @action(
         detail=True,
@@ -113,16 +207,88 @@ class RecipeViewSet(viewsets.ModelViewSet):
         ).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def change_recipe_list(request, model):
+        """Добавляет рецепты в список пользователя или удаляет из него.
+
+        Рецепты проверяются одним запросом, запись — одним INSERT или
+        DELETE, который возвращает действительно изменённые строки: по ним
+        обновляются счётчики, кэш связей и список покупок, потому что
+        сигналы на каждую строку не отправляются.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(
+            serializer.validated_data['recipes']
+        ))
+        found = set(Recipe.objects.filter(
+            pk__in=recipe_ids
+        ).order_by().values_list('pk', flat=True))
+        adding = request.method == 'POST'
+        change = add_recipes if adding else remove_recipes
+        with transaction.atomic():
+            changed_ids = set(change(
+                model, request.user.pk,
+                [pk for pk in recipe_ids if pk in found],
+            ))
+            if changed_ids:
+                bulk_change_counters(
+                    model,
+                    [model(user=request.user, recipe_id=pk)
+                     for pk in changed_ids],
+                    1 if adding else -1,
+                )
+                invalidate_relations(request.user.pk)
+                if model is ShoppingCart:
+                    change_cart(
+                        request.user.pk, changed_ids, 1 if adding else -1
+                    )
+        changed, unchanged, not_found = BATCH_STATUSES[request.method]
+        return Response({'results': [
+            {
+                'id': pk,
+                'status': not_found if pk not in found
+                else changed if pk in changed_ids else unchanged,
+            }
+            for pk in recipe_ids
+        ]})
+
+    @action(
+        detail=False,
+        methods=('POST', 'DELETE'),
+        url_path='shopping_cart',
+        permission_classes=[IsAuthenticated])
+    def shopping_cart_batch(self, request):
+        return self.change_recipe_list(request, ShoppingCart)
 
-class TagViewSet(mixins.RetrieveModelMixin,
+    @action(
+        detail=False,
+        methods=('POST', 'DELETE'),
+        url_path='favorite',
+        permission_classes=[IsAuthenticated])
+    def favorite_batch(self, request):
+        return self.change_recipe_list(request, Favorite)
+
+
+class TagViewSet(ReplicaReadMixin,
+                 mixins.RetrieveModelMixin,
                  mixins.ListModelMixin,
                  viewsets.GenericViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [IsAdminOrReadOnly]
 
+    @cached_reference(Tag)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_reference(Tag)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
-class IngredientViewSet(mixins.RetrieveModelMixin,
+
+class IngredientViewSet(ReplicaReadMixin,
+                        mixins.RetrieveModelMixin,
                         mixins.ListModelMixin,
                         viewsets.GenericViewSet):
     queryset = Ingredient.objects.all()
@@ -131,11 +297,23 @@ class IngredientViewSet(mixins.RetrieveModelMixin,
     filter_backends = (DjangoFilterBackend, IngredientSearchFilter)
     search_fields = ('^name',)
 
+    @cached_reference(Ingredient)
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get(IngredientSearchFilter.search_param)
+        if name:
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
+
+    @cached_reference(Ingredient)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
-class UserViewSet(UserViewSet):
+class UserViewSet(ReplicaReadMixin, UserViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
-    pagination_class = CustomPagination
+    pagination_class = OptionalKeysetPagination
+    keyset_ordering = ('username', 'id')
 
     @action(
         detail=True,
@@ -165,12 +343,42 @@ class UserViewSet(UserViewSet):
             ).delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def get_recipes_limit(request):
+        limit = request.query_params.get('recipes_limit')
+        if not limit:
+            return None
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            raise ValidationError(
+                {'recipes_limit': 'Укажите целое положительное число.'}
+            )
+        return limit
+
+    @staticmethod
+    def get_recipe_previews(limit):
+        """Первые limit рецептов каждого автора страницы одним запросом."""
+        recipes = Recipe.objects.order_by('-pub_date', '-id')
+        if limit is not None:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).order_by('-pub_date', '-id').values('pk')[:limit]
+            ))
+        return Prefetch('recipes', queryset=recipes, to_attr='recipe_previews')
+
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
         user = request.user
-        queryset = User.objects.filter(following__user=user)
+        queryset = User.objects.filter(following__user=user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('username', 'id').prefetch_related(
+            self.get_recipe_previews(self.get_recipes_limit(request))
+        )
         pages = self.paginate_queryset(queryset)
-        serializer = SubscribeListSerializer(
+        return self.get_paginated_response(SubscribeListSerializer(
             pages, many=True, context={'request': request}
-        )
-        return self.get_paginated_response(serializer.data)
+        ).data)
@@ -1,5 +1,9 @@
+from administration.changelist import AuthorFilter, EstimatedCountPaginator
 from django.contrib import admin
 
+from api.shopping_list import rebuild_shopping_lists
+from print.models import ShoppingCart
+
 from .models import IngredientRecipe, Recipe
 
 
@@ -7,6 +11,7 @@ class IngredientInline(admin.TabularInline):
     model = IngredientRecipe
     extra = 3
     min_num = 1
+    autocomplete_fields = ('ingredient', )
 
 
 @admin.register(Recipe)
@@ -20,20 +25,35 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     search_fields = (
         'name',
-        'author',
-        'tags'
+        'author__username',
     )
     list_filter = (
-        'author',
-        'name',
+        AuthorFilter,
         'tags'
     )
+    list_select_related = ('author', )
+    autocomplete_fields = ('author', )
     inlines = (IngredientInline,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('ingredients')
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if change:
+            # Ингредиенты из формы сохраняются по одному, поэтому списки
+            # покупок с этим рецептом проще собрать заново.
+            rebuild_shopping_lists(ShoppingCart.objects.filter(
+                recipe=form.instance
+            ).values_list('user_id', flat=True))
+
     def get_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
     get_favorites.short_description = 'Избранное'
+    get_favorites.admin_order_field = 'favorites_count'
 
     def get_ingredients(self, obj):
         return ', '.join([
@@ -0,0 +1,56 @@
+from django.db import migrations
+
+# Таблица полнотекстового поиска по рецептам ведётся в api.search.
+# В PostgreSQL — tsvector с GIN-индексом, в SQLite — таблица FTS5,
+# для остальных баз таблица не создаётся и поиск идёт по подстроке.
+CREATE_SQL = {
+    'postgresql': [
+        'CREATE TABLE cook_recipe_search ('
+        'recipe_id bigint PRIMARY KEY REFERENCES cook_recipe (id) '
+        'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+        'document tsvector NOT NULL)',
+        'CREATE INDEX cook_recipe_search_document_idx '
+        'ON cook_recipe_search USING gin (document)',
+        "INSERT INTO cook_recipe_search (recipe_id, document) SELECT r.id, "
+        "setweight(to_tsvector('russian', r.name), 'A') || "
+        "setweight(to_tsvector('russian', "
+        "coalesce(string_agg(i.name, ' '), '')), 'B') || "
+        "setweight(to_tsvector('russian', r.text), 'C') "
+        'FROM cook_recipe r '
+        'LEFT JOIN cook_ingredientrecipe ir ON ir.recipe_id = r.id '
+        'LEFT JOIN administration_ingredient i ON i.id = ir.ingredient_id '
+        'GROUP BY r.id, r.name, r.text',
+    ],
+    'sqlite': [
+        'CREATE VIRTUAL TABLE cook_recipe_search '
+        'USING fts5(name, ingredients, text)',
+        'INSERT INTO cook_recipe_search (rowid, name, ingredients, text) '
+        "SELECT r.id, r.name, coalesce(group_concat(i.name, ' '), ''), "
+        'r.text FROM cook_recipe r '
+        'LEFT JOIN cook_ingredientrecipe ir ON ir.recipe_id = r.id '
+        'LEFT JOIN administration_ingredient i ON i.id = ir.ingredient_id '
+        'GROUP BY r.id, r.name, r.text',
+    ],
+}
+
+
+def create_search_table(apps, schema_editor):
+    for sql in CREATE_SQL.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(sql)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        schema_editor.execute('DROP TABLE cook_recipe_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administration', '0005_alter_ingredient_name'),
+        ('cook', '0007_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.16 on 2026-10-17 23:25
+
+import os
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def _last_variant(name):
+    # Как api.images.variant_name(name, 'card', webp=True): этот вариант
+    # make_variants пишет последним.
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'variants', f'{stem}_card.webp')
+
+
+def fill_variants_image(apps, schema_editor):
+    Recipe = apps.get_model('cook', 'Recipe')
+    names = Recipe.objects.exclude(image='').order_by().values_list(
+        'image', flat=True
+    ).distinct()
+    for name in names.iterator():
+        if default_storage.exists(_last_variant(name)):
+            Recipe.objects.filter(image=name).update(variants_image=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cook', '0011_similar_recipes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='variants_image',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='Изображение с готовыми копиями'),
+        ),
+        migrations.RunPython(fill_variants_image, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,25 @@
 from django.db import models
+from django.db.models import Prefetch
 
 from administration.models import Ingredient, Tag
 from users.models import User
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Выборка рецептов для сериализации без N+1 запросов."""
+
+    def for_serialization(self):
+        return self.select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredientrecipes',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            ),
+        )
+
+
 class Recipe(models.Model):
     name = models.CharField(
         verbose_name='Название рецепта',
@@ -29,6 +45,14 @@ class Recipe(models.Model):
         verbose_name='Изображение блюда',
         upload_to='recipe_images/',
     )
+    # Изображение, для которого готовы уменьшенные копии: при замене
+    # картинки старые копии не выдаются за новые.
+    variants_image = models.CharField(
+        verbose_name='Изображение с готовыми копиями',
+        max_length=100,
+        blank=True,
+        editable=False,
+    )
     pub_date = models.DateTimeField(
         verbose_name='Дата публикации',
         auto_now_add=True
@@ -42,11 +66,39 @@ class Recipe(models.Model):
         Tag,
         verbose_name='Теги'
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False,
+    )
+    # Набор ингредиентов изменился после расчёта похожих рецептов.
+    similar_outdated = models.BooleanField(
+        verbose_name='Похожие рецепты устарели',
+        default=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
         ordering = ["-pub_date"]
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -79,3 +131,34 @@ class IngredientRecipe(models.Model):
             f"{self.ingredient.name} - {self.amount} "
             f"{self.ingredient.measurement_unit}"
         )
+
+
+class SimilarRecipe(models.Model):
+    """ Рецепт из top-K похожих по ингредиентам. """
+    recipe = models.ForeignKey(
+        to=Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='similar_recipes',
+    )
+    similar = models.ForeignKey(
+        to=Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Похожий рецепт',
+        related_name='similar_to',
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name='Место')
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'rank'],
+                name='unique_similar_recipe_rank',
+            )
+        ]
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return f'{self.recipe} ~ {self.similar}'
@@ -0,0 +1,52 @@
+import os
+
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+os.environ.setdefault('ASYNC_READ_VIEWS', '1')
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """Потоковые ответы читаются в потоке синхронного кода.
+
+    Django 3.2 перебирает итератор потокового ответа прямо в цикле
+    событий: запросы к базе из него там запрещены и блокировали бы
+    остальные соединения. Части ответа забираются через sync_to_async
+    в том же потоке, где выполнялось представление, и отправляются
+    перед завершающим сообщением.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            await super().send_response(response, send)
+            return
+        parts = iter(response)
+        response.streaming_content = ()
+        next_part = sync_to_async(next, thread_sensitive=True)
+
+        async def send_with_parts(message):
+            if (message['type'] == 'http.response.body'
+                    and not message.get('more_body')):
+                part = await next_part(parts, None)
+                while part is not None:
+                    await send({
+                        'type': 'http.response.body',
+                        'body': part,
+                        'more_body': True,
+                    })
+                    part = await next_part(parts, None)
+            await send(message)
+
+        await super().send_response(response, send_with_parts)
+
+
+django.setup(set_prefix=False)
+application = StreamingASGIHandler()
+
+from api.checks import check_server_startup  # noqa: E402
+from api.ingredient_index import ingredient_index  # noqa: E402
+
+check_server_startup()
+ingredient_index.warm_up()
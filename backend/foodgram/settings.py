@@ -32,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,6 +81,43 @@ else:
         }
     }
 
+# Постоянные соединения: не открывать новое на каждый запрос.
+DATABASES['default']['CONN_MAX_AGE'] = int(
+    os.getenv('DB_CONN_MAX_AGE', default=60)
+)
+
+
+def replica_database(location):
+    """Реплика с настройками основной базы: для PostgreSQL location —
+    host[:port][/name], для SQLite — путь к файлу."""
+    replica = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if replica['ENGINE'].endswith('sqlite3'):
+        replica['NAME'] = location
+        return replica
+    address, _, name = location.partition('/')
+    host, _, port = address.partition(':')
+    replica.update(
+        HOST=host or replica['HOST'],
+        PORT=port or replica['PORT'],
+        NAME=name or replica['NAME'],
+    )
+    return replica
+
+
+# Реплики для чтения через запятую. Безопасные запросы к рецептам, тегам,
+# ингредиентам и пользователям читают с них; после записи пользователь
+# DB_REPLICA_MAX_LAG секунд читает с основной базы, реплики с большим
+# отставанием пропускаются.
+DATABASE_REPLICAS = []
+for number, location in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(',')), start=1
+):
+    DATABASES[f'replica{number}'] = replica_database(location.strip())
+    DATABASE_REPLICAS.append(f'replica{number}')
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', default=5))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -100,7 +138,7 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.AllowAny",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
 }
 
@@ -129,8 +167,60 @@ USE_L10N = True
 
 USE_TZ = True
 
+# Общий кэш (например, memcached или redis) нужен, когда процессов
+# несколько: в нём лежат версии справочников и индекса ингредиентов.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+REFERENCE_CACHE_TIMEOUT = int(
+    os.getenv('REFERENCE_CACHE_TIMEOUT', default=24 * 60 * 60)
+)
+USER_RELATIONS_CACHE_TIMEOUT = int(
+    os.getenv('USER_RELATIONS_CACHE_TIMEOUT', default=60 * 60)
+)
+AUTH_TOKEN_CACHE_TIMEOUT = int(
+    os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', default=5 * 60)
+)
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', default=10000))
+# Рецепты авторов с большим числом подписчиков не раскладываются по
+# лентам при публикации, а добавляются в ленту при чтении.
+FEED_FANOUT_MAX_FOLLOWERS = int(
+    os.getenv('FEED_FANOUT_MAX_FOLLOWERS', default=1000)
+)
+
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+RECIPE_IMAGE_MAX_BYTES = int(
+    os.getenv('RECIPE_IMAGE_MAX_BYTES', default=5 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_PIXELS = int(
+    os.getenv('RECIPE_IMAGE_MAX_PIXELS', default=25_000_000)
+)
+# Процессы для подготовки вариантов изображений; 0 — в потоке запроса.
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+
+# Асинхронные представления для частых запросов на чтение; включается
+# точкой входа foodgram.asgi, под WSGI они дали бы лишний переход потоков.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', default='0') == '1'
+
+# Заголовок Server-Timing с числом и временем запросов к базе, временем
+# сериализации и повторами запросов; доля запросов, попадающих в журнал.
+SERVER_TIMING = os.getenv('SERVER_TIMING', default='0') == '1'
+SERVER_TIMING_LOG_RATE = float(
+    os.getenv('SERVER_TIMING_LOG_RATE', default=0.01)
+)
+
+SHOPPING_LIST_FONT = os.getenv(
+    'SHOPPING_LIST_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
@@ -5,3 +5,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_wsgi_application()
+
+from api.checks import check_server_startup  # noqa: E402
+from api.ingredient_index import ingredient_index  # noqa: E402
+
+check_server_startup()
+ingredient_index.warm_up()
@@ -1,3 +1,5 @@
+from administration.changelist import (EstimatedCountPaginator, RecipeFilter,
+                                       UserFilter)
 from django.contrib import admin
 
 from .models import Favorite, ShoppingCart
@@ -5,15 +7,23 @@ from .models import Favorite, ShoppingCart
 
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
-    list_filter = ('user', 'recipe')
-    search_fields = ('user', 'recipe')
+    list_filter = (UserFilter, RecipeFilter)
+    list_select_related = ('user', 'recipe')
+    search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('recipe', 'user')
-    list_filter = ('recipe', 'user')
-    search_fields = ('user', )
+    list_filter = (RecipeFilter, UserFilter)
+    list_select_related = ('recipe', 'user')
+    search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
@@ -0,0 +1,67 @@
+# Generated by Django 3.2.16 on 2026-10-17 22:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Как FEED_BACKFILL_RECIPES в api/feed.py.
+BACKFILL_RECIPES = 100
+
+
+def fill_feeds(apps, schema_editor):
+    Follow = apps.get_model('users', 'Follow')
+    Recipe = apps.get_model('cook', 'Recipe')
+    FeedItem = apps.get_model('print', 'FeedItem')
+    authors = Follow.objects.filter(
+        author__followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).order_by().values_list('author', flat=True).distinct()
+    for author_id in authors.iterator():
+        recipes = list(
+            Recipe.objects.filter(author=author_id)
+            .order_by('-pub_date', '-id')
+            .values_list('id', 'pub_date')[:BACKFILL_RECIPES]
+        )
+        FeedItem.objects.bulk_create(
+            (FeedItem(user_id=user_id, recipe_id=recipe_id,
+                      pub_date=pub_date)
+             for user_id in Follow.objects.filter(
+                 author=author_id
+             ).values_list('user', flat=True).iterator()
+             for recipe_id, pub_date in recipes),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cook', '0010_recipe_author_pub_date_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('print', '0003_shopping_list_item'),
+        ('users', '0003_user_followers_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to='cook.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Лента',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', '-pub_date', '-recipe'], name='feed_user_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feeditem',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_feed_item'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
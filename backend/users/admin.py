@@ -1,11 +1,14 @@
+from administration.changelist import EstimatedCountPaginator
 from django.contrib import admin
 
 from .models import User
 
 
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('username', 'email')
-    list_filter = ('username', 'email')
+    list_display = ('username', 'email', 'recipes_count', 'followers_count')
+    search_fields = ('username', 'email')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(User, UserAdmin)
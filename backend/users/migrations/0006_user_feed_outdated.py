@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-17 23:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_alter_user_managers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='feed_outdated',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Ленты подписчиков устарели'),
+        ),
+    ]
@@ -1,7 +1,34 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as BaseUserManager
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.db import models
 from django.db.models import F, Q, UniqueConstraint
+from django.dispatch import Signal
+
+# Поля пользователя, которые аутентификация по токену берёт из кэша.
+TOKEN_USER_FIELDS = (
+    'id', 'email', 'username', 'first_name', 'last_name', 'is_active',
+    'is_staff', 'is_superuser',
+)
+# Отправляется после QuerySet.update() этих полей или пароля: update()
+# не отправляет post_save. Аргумент user_ids — id изменённых строк.
+auth_fields_updated = Signal()
+
+
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        if not kwargs.keys() & {'password', *TOKEN_USER_FIELDS}:
+            return super().update(**kwargs)
+        # До обновления: фильтр может быть по изменяемому полю.
+        user_ids = list(self.values_list('pk', flat=True))
+        try:
+            return super().update(**kwargs)
+        finally:
+            auth_fields_updated.send(sender=self.model, user_ids=user_ids)
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    pass
 
 
 class User(AbstractUser):
@@ -26,6 +53,25 @@ class User(AbstractUser):
         unique=True,
         validators=(UnicodeUsernameValidator(), )
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Число рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Число подписчиков',
+        default=0,
+        editable=False,
+    )
+    # Автор опустился до FEED_FANOUT_MAX_FOLLOWERS подписчиков: его
+    # последние рецепты ещё не разложены по лентам.
+    feed_outdated = models.BooleanField(
+        verbose_name='Ленты подписчиков устарели',
+        default=False,
+        editable=False,
+    )
+
+    objects = UserManager()
 
     class Meta:
         ordering = ('username', )
@@ -63,6 +109,13 @@ class Follow(models.Model):
                 name='no_self_follow'
             )
         ]
+        # Подписчики автора по порядку — пачки раскладки ленты.
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx',
+            ),
+        ]
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
 